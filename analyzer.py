@@ -2,75 +2,133 @@
 # Extract structural + semantic signals from code cells.These are HEURISTICS, not a full dependency graph.
 
 import ast
+import re
+from concurrent.futures import ProcessPoolExecutor
 from typing import Set, Dict, List
 import builtins
-BUILTINS = set(dir(builtins))
-
-
-# --------------------------------------------------
-# Extract variables defined in the cell
-# --------------------------------------------------
-def get_defined_vars(tree: ast.AST) -> Set[str]:
-    defined = set()
-
-    for node in ast.walk(tree):
-
-        # x = ...
-        if isinstance(node, ast.Assign):
-            for target in node.targets:
-                if isinstance(target, ast.Name):
-                    defined.add(target.id)
-
-        # def foo():
-        elif isinstance(node, ast.FunctionDef):
-            defined.add(node.name)
-
-        # function arguments
-        elif isinstance(node, ast.FunctionDef):
-            defined.add(node.name)
-            for arg in node.args.args:
-                defined.add(arg.arg)
 
+import tracing
+BUILTINS = set(dir(builtins))
 
-        # class Foo:
-        elif isinstance(node, ast.ClassDef):
-            defined.add(node.name)
+# Names IPython injects into every notebook namespace
+IPYTHON_BUILTINS = {"display", "get_ipython", "In", "Out", "exit", "quit"}
 
-        # import numpy as np
-        elif isinstance(node, ast.Import):
-            for alias in node.names:
-                defined.add(alias.asname or alias.name.split(".")[0])
+# Cell magics whose body is still Python (%%bash, %%html, %%writefile ... are not)
+PYTHON_CELL_MAGICS = {"time", "timeit", "capture", "prun", "debug", "memit"}
 
-        # from sklearn.model_selection import train_test_split
-        elif isinstance(node, ast.ImportFrom):
-            for alias in node.names:
-                defined.add(alias.asname or alias.name)
 
-        # for i in range(...)
-        elif isinstance(node, ast.For):
-            if isinstance(node.target, ast.Name):
-                defined.add(node.target.id)
+# --------------------------------------------------
+# Single-pass signal collector
+# --------------------------------------------------
+class _SignalCollector(ast.NodeVisitor):
+    """Collects defined vars, used vars and called symbols in one walk over the tree."""
+
+    def __init__(self):
+        self.defined: Set[str] = set()
+        self.used: Set[str] = set()
+        self.called: Set[str] = set()
+
+    def _add_targets(self, target: ast.AST):
+        # x / (X_train, X_test) / [a, *rest]
+        if isinstance(target, ast.Name):
+            self.defined.add(target.id)
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for element in target.elts:
+                self._add_targets(element)
+        elif isinstance(target, ast.Starred):
+            self._add_targets(target.value)
+
+    # x = ...  /  X_train, X_test, y_train, y_test = ...
+    def visit_Assign(self, node: ast.Assign):
+        for target in node.targets:
+            self._add_targets(target)
+        self.generic_visit(node)
+
+    # x += ...  /  x: int = ...
+    def visit_AugAssign(self, node: ast.AugAssign):
+        self._add_targets(node.target)
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node: ast.AnnAssign):
+        self._add_targets(node.target)
+        self.generic_visit(node)
+
+    # def foo():
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self.defined.add(node.name)
+        self.generic_visit(node)
+
+    # class Foo:
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self.defined.add(node.name)
+        self.generic_visit(node)
+
+    # import numpy as np
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            self.defined.add(alias.asname or alias.name.split(".")[0])
+
+    # from sklearn.model_selection import train_test_split
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        for alias in node.names:
+            self.defined.add(alias.asname or alias.name)
+
+    # for i in range(...)  /  for i, row in df.iterrows()
+    def visit_For(self, node: ast.For):
+        self._add_targets(node.target)
+        self.generic_visit(node)
+
+    # with open(...) as f
+    def visit_With(self, node: ast.With):
+        for item in node.items:
+            if item.optional_vars and isinstance(item.optional_vars, ast.Name):
+                self.defined.add(item.optional_vars.id)
+        self.generic_visit(node)
+
+    # variables read
+    def visit_Name(self, node: ast.Name):
+        if isinstance(node.ctx, ast.Load):
+            self.used.add(node.id)
+
+    # function(...) / obj.method(...)
+    def visit_Call(self, node: ast.Call):
+        if isinstance(node.func, ast.Attribute):
+            parts = []
+            obj = node.func
+
+            while isinstance(obj, ast.Attribute):
+                parts.append(obj.attr)
+                obj = obj.value
+
+            if isinstance(obj, ast.Name):
+                parts.append(obj.id)
+
+            self.called.add(".".join(reversed(parts)))
+
+        elif isinstance(node.func, ast.Name):
+            self.called.add(node.func.id)
+
+        self.generic_visit(node)
+
+
+def _collect(tree: ast.AST) -> _SignalCollector:
+    collector = _SignalCollector()
+    collector.visit(tree)
+    return collector
 
-        # with open(...) as f
-        elif isinstance(node, ast.With):
-            for item in node.items:
-                if item.optional_vars and isinstance(item.optional_vars, ast.Name):
-                    defined.add(item.optional_vars.id)
 
-    return defined
+# --------------------------------------------------
+# Extract variables defined in the cell
+# --------------------------------------------------
+def get_defined_vars(tree: ast.AST) -> Set[str]:
+    return _collect(tree).defined
 
 
 # --------------------------------------------------
 # Extract variables used (read) in the cell
 # --------------------------------------------------
 def get_used_vars(tree: ast.AST) -> Set[str]:
-    used = set()
-
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
-            used.add(node.id)
-
-    return used
+    return _collect(tree).used
 
 
 # --------------------------------------------------
@@ -83,30 +141,74 @@ def extract_called_symbols(tree: ast.AST) -> List[str]:
     - model.fit
     - plt.show
     """
-    called = set()
+    return sorted(_collect(tree).called)
+
+
+# --------------------------------------------------
+# IPython syntax masking
+# --------------------------------------------------
+_MAGIC_LINE = re.compile(r"^(\s*)(%|!|\?)")
+
+# %time / %timeit / %prun / %memit [options] <statement>: only the prefix is masked, the timed statement
+# is still analyzed. Option values: numbers for -n/-r/-p, one token for %prun's -s/-l/-T/-D.
+_TIMED_LINE = re.compile(
+    r"^(\s*)%(?:time|timeit|prun|memit)\s+(?:-[nrp]\s*\d+\s+|-[slTD]\s*\S+\s+|-[oqrci]\s+)*(\S.*)$"
+)
+_HELP_LINE = re.compile(r"^(\s*)[\w\.]+\?{1,2}\s*$")
+_MAGIC_ASSIGN = re.compile(r"^(\s*)([A-Za-z_][\w\.]*(?:\s*,\s*[A-Za-z_][\w\.]*)*)\s*=\s*[%!]")
+
+
+def mask_ipython_syntax(code: str) -> str | None:
+    """
+    Replaces IPython-only lines (%magics, !shell escapes, obj? help) with plain Python
+    of the same indentation, so the rest of the cell can still be parsed.
+    `files = !ls` becomes `files = None`, keeping `files` as a defined name, and
+    `%timeit -n 10 model.predict(X)` keeps the timed statement `model.predict(X)`.
+    Only called after plain ast.parse failed, so valid Python cells are analyzed unchanged.
+    Returns None when the whole cell is a non-Python cell magic such as %%bash.
+    """
+    lines = code.splitlines()
 
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Call):
+    first = next((i for i, line in enumerate(lines) if line.strip()), None)
+    if first is not None and lines[first].lstrip().startswith("%%"):
+        magic = lines[first].lstrip()[2:].split(maxsplit=1)
+        if not magic or magic[0] not in PYTHON_CELL_MAGICS:
+            return None
+        lines[first] = "pass"
 
-            # obj.method(...)
-            if isinstance(node.func, ast.Attribute):
-                parts = []
-                obj = node.func
+    masked = []
+    for line in lines:
+        assign = _MAGIC_ASSIGN.match(line)
+        if assign:
+            masked.append(f"{assign.group(1)}{assign.group(2)} = None")
+            continue
 
-                while isinstance(obj, ast.Attribute):
-                    parts.append(obj.attr)
-                    obj = obj.value
+        timed = _TIMED_LINE.match(line)
+        if timed:
+            masked.append(f"{timed.group(1)}{timed.group(2)}")
+            continue
 
-                if isinstance(obj, ast.Name):
-                    parts.append(obj.id)
+        magic = _MAGIC_LINE.match(line) or _HELP_LINE.match(line)
+        masked.append(f"{magic.group(1)}pass" if magic else line)
 
-                called.add(".".join(reversed(parts)))
+    return "\n".join(masked)
 
-            # function(...)
-            elif isinstance(node.func, ast.Name):
-                called.add(node.func.id)
 
-    return sorted(called)
+def _parse_cell_source(code: str) -> ast.AST | None:
+    try:
+        return ast.parse(code)
+    except SyntaxError:
+        pass
+
+    # Only mask after a failed parse, so plain Python is never rewritten
+    masked = mask_ipython_syntax(code)
+    if masked is None:
+        return None
+
+    try:
+        return ast.parse(masked)
+    except SyntaxError:
+        return None
 
 
 # --------------------------------------------------
@@ -118,20 +220,17 @@ def analyze_code_cell(cell: Dict) -> Dict:
 
     code = cell.get("source", "")
 
-    try:
-        tree = ast.parse(code)
-
-        defined = get_defined_vars(tree)
-        used = get_used_vars(tree)
-        called_symbols = extract_called_symbols(tree)
-
-    except SyntaxError:
+    tree = _parse_cell_source(code)
+    if tree is not None:
+        signals = _collect(tree)
+        defined, used, called_symbols = signals.defined, signals.used, signals.called
+    else:
         defined, used, called_symbols = set(), set(), []
 
     # Heuristic external dependencies
     external_inputs = {
         var for var in used
-        if var not in defined and var not in BUILTINS
+        if var not in defined and var not in BUILTINS and var not in IPYTHON_BUILTINS
     }
 
     # Store ALL signals explicitly
@@ -140,4 +239,22 @@ def analyze_code_cell(cell: Dict) -> Dict:
     cell["external_inputs"] = sorted(external_inputs)
     cell["called_symbols"] = sorted(called_symbols)
 
-    return cell
\ No newline at end of file
+    return cell
+
+
+# --------------------------------------------------
+# Batch API
+# --------------------------------------------------
+@tracing.traced("analyze")
+def analyze_cells(cells: List[Dict], workers: int = 1, chunksize: int = 64) -> List[Dict]:
+    """
+    Analyzes a whole notebook (or corpus) of cells and returns them in input order.
+    With workers > 1 the cells are spread over a process pool; the returned dicts are then
+    copies, so always use the return value rather than relying on in-place updates.
+    """
+    if workers <= 1 or len(cells) <= chunksize:
+        return [analyze_code_cell(c) for c in cells]
+
+    # analyze_code_cell records no spans; init_worker only keeps workers off the parent's trace file
+    with ProcessPoolExecutor(max_workers=workers, initializer=tracing.init_worker, initargs=(False,)) as pool:
+        return list(pool.map(analyze_code_cell, cells, chunksize=chunksize))
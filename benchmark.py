@@ -0,0 +1,327 @@
+# benchmark.py: component-level performance benchmarks, on the bundled notebook and on synthetic
+# corpora scaled 10x / 100x / 1000x. Embeddings and the LLM are deterministic offline stand-ins,
+# so it runs with no Ollama, Groq or network. Results are written as JSON, to compare between versions.
+# process_peak_rss_mb is the process-wide high-water mark; per-component memory needs --trace-memory.
+#
+# Usage: python benchmark.py [--scales 1,10,100,1000] [--queries 50] [--codet5] [--trace-memory]
+#                            [--output artifacts/benchmark.json]
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from parser import parse_notebook
+from analyzer import analyze_code_cell
+from explainer import clean_cell_output
+from final_object_builder import assign_sections, build_final_object
+from rag_document_builder import build_rag_documents
+from rag_text_splitter import split_text_documents, split_code_documents
+from index_builder import build_collection, load_collection
+from lineage import build_lineage_index, save_lineage_index
+from bm25_index import BM25Index, BM25_FILENAME
+from numpy_store import NumpyVectorStore, NUMPY_STORE_DIR
+from retrieval import RelationalRetriever
+from query_engine import NotebookChatbot
+
+NOTEBOOK = "SVM Training and EDA.ipynb"
+OUTPUT = "artifacts/benchmark.json"
+SCALES = (1, 10, 100, 1000)
+
+# Same dimension as bge-m3, so vector math and storage cost what they cost in production
+EMBED_DIM = 1024
+
+QUESTIONS = [
+    "What was the accuracy of the SVM model?",
+    "Why and where cross validation is used in the notebook?",
+    "How were the features scaled?",
+    "Which columns were dropped during preprocessing?",
+    "Show me the code that trains the model",
+    "How was the dataset split into train and test sets?",
+    "What does the confusion matrix show?",
+    "Which libraries are imported?",
+    "How many rows does the dataset have?",
+    "What kernel was used for the SVC?",
+]
+
+INTENT_KEYWORDS = [
+    ("evaluation", ("accuracy", "score", "confusion", "report")),
+    ("model_training", (".fit(", "SVC", "GridSearch")),
+    ("visualization", ("plt.", "sns.")),
+    ("data_loading", ("read_csv", "load_")),
+]
+
+
+# --------------------------------------------------
+# Measurement helpers
+# --------------------------------------------------
+@contextlib.contextmanager
+def _quiet():
+    """The pipeline prints progress on every call; keep it out of the timings and the report."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def _process_peak_rss_mb() -> float:
+    """
+    High-water mark of the whole process so far: it never goes down, so it is not a per-component
+    figure (later components repeat the heaviest earlier peak). Use --trace-memory for those.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    index = min(int(round(q * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class Bench:
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.results = []
+
+    def measure(self, component: str, scale: int, fn, calls, units: int | None = None):
+        """
+        Times fn(*args) for every args tuple in calls. units is how many items all calls process
+        together (cells, chunks, queries); it defaults to the number of calls.
+        """
+        calls = list(calls)
+        if self.trace_memory:
+            tracemalloc.start()
+
+        samples = []
+        with _quiet():
+            for args in calls:
+                start = time.perf_counter()
+                fn(*args)
+                samples.append(time.perf_counter() - start)
+
+        record = {
+            "component": component,
+            "scale": scale,
+            "calls": len(calls),
+            "units": units if units is not None else len(calls),
+            "total_seconds": round(sum(samples), 4),
+            "throughput_per_s": round((units if units is not None else len(calls)) / sum(samples), 1)
+            if sum(samples) else None,
+            "p50_ms": round(_percentile(samples, 0.50) * 1000, 3),
+            "p95_ms": round(_percentile(samples, 0.95) * 1000, 3),
+            "process_peak_rss_mb": _process_peak_rss_mb(),
+        }
+        if self.trace_memory:
+            # Per-component memory: the peak of Python allocations made while this component ran
+            record["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+            tracemalloc.stop()
+
+        self.results.append(record)
+        print(f"  {component:<28} x{scale:<5} {record['units']:>8} units  "
+              f"{record['throughput_per_s'] or 0:>10}/s  p50 {record['p50_ms']:>9} ms  "
+              f"p95 {record['p95_ms']:>9} ms  process peak rss {record['process_peak_rss_mb']} MB"
+              + (f"  traced peak {record['peak_traced_mb']} MB" if self.trace_memory else ""))
+        return record
+
+
+# --------------------------------------------------
+# Synthetic corpus
+# --------------------------------------------------
+def scale_notebook(notebook_path: str, factor: int, out_path: str) -> str:
+    """Writes a notebook with every cell repeated `factor` times, under fresh cell ids."""
+    with open(notebook_path, "r", encoding="utf-8") as f:
+        notebook = json.load(f)
+
+    cells = []
+    for rep in range(factor):
+        for i, cell in enumerate(notebook["cells"]):
+            copy = dict(cell)
+            copy["id"] = f"{cell.get('id', f'cell-{i}')}-{rep}"
+            cells.append(copy)
+    notebook["cells"] = cells
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(notebook, f)
+    return out_path
+
+
+def fake_explain(cell: dict) -> dict:
+    """Deterministic stand-in for explainer.explain_cell (no LLM)."""
+    source = cell.get("source", "")
+    first_line = source.strip().splitlines()[0] if source.strip() else "empty cell"
+    cell["intent"] = next(
+        (intent for intent, words in INTENT_KEYWORDS if any(w in source for w in words)), "preprocessing"
+    )
+    cell["purpose"] = f"Runs `{first_line[:80]}` as part of the {cell['intent']} step."
+    cell["explanation"] = (
+        f"This cell uses {', '.join(cell.get('called_symbols', [])[:5]) or 'plain Python'} "
+        f"and defines {', '.join(cell.get('defined', [])[:5]) or 'nothing new'}."
+    )
+    cell["result_summary"] = "Finished without errors." if not cell.get("has_error") else "Raised an error."
+    cell["explanation_error"] = False
+    return cell
+
+
+# --------------------------------------------------
+# Benchmarks
+# --------------------------------------------------
+def bench_scale(bench: Bench, scale: int, workdir: str, n_queries: int, embeddings):
+    print(f"\n📏 Scale x{scale}")
+    notebook = scale_notebook(NOTEBOOK, scale, os.path.join(workdir, f"notebook_x{scale}.ipynb"))
+    repeats = 3 if scale <= 100 else 1
+
+    # Parse
+    with _quiet():
+        parsed = parse_notebook(notebook)
+    bench.measure("parse_notebook", scale, parse_notebook, [(notebook,)] * repeats, len(parsed) * repeats)
+    bench.measure("parse_notebook[streaming]", scale, lambda p: parse_notebook(p, streaming=True),
+                  [(notebook,)] * repeats, len(parsed) * repeats)
+
+    # Analyze, clean outputs
+    code_cells = [c for c in assign_sections(parsed) if c["type"] == "code"]
+    bench.measure("analyze_code_cell", scale, analyze_code_cell, [(c,) for c in code_cells])
+    bench.measure("clean_cell_output", scale, clean_cell_output, [(c.get("outputs", []),) for c in code_cells])
+
+    # Fake explain -> warehouse -> documents
+    custom_object = {}
+    for cell in code_cells:
+        obj = build_final_object(cell, cell, fake_explain(cell))
+        custom_object[obj["cell_id"]] = obj
+
+    with _quiet():
+        code_docs, text_docs = build_rag_documents(list(custom_object.values()))
+        split_text = split_text_documents(text_docs)
+    bench.measure("split_text_documents", scale, split_text_documents, [(text_docs,)] * repeats,
+                  len(text_docs) * repeats)
+    bench.measure("split_code_documents", scale, split_code_documents, [(code_docs,)] * repeats,
+                  len(code_docs) * repeats)
+
+    # Index: warehouse files + Chroma build/load + NumPy export
+    index_dir = os.path.join(workdir, f"index_x{scale}")
+    persist_dir = os.path.join(index_dir, "chroma_store")
+    doc_store_path = os.path.join(index_dir, "custom_object.json")
+    lineage_path = os.path.join(index_dir, "lineage_index.json")
+    os.makedirs(persist_dir, exist_ok=True)
+
+    with open(doc_store_path, "w", encoding="utf-8") as f:
+        json.dump(custom_object, f)
+    with _quiet():
+        save_lineage_index(build_lineage_index(list(custom_object.values())), lineage_path)
+        BM25Index.build(list(custom_object.values())).save(os.path.join(persist_dir, BM25_FILENAME))
+
+    bench.measure("chroma_build", scale,
+                  lambda: build_collection(split_text, embeddings, "notebook_text_rag", persist_dir=persist_dir),
+                  [()], len(split_text))
+    bench.measure("chroma_load", scale,
+                  lambda: load_collection(embeddings, "notebook_text_rag", persist_dir=persist_dir)._collection.count(),
+                  [()] * repeats, repeats)
+    with _quiet():
+        collection = load_collection(embeddings, "notebook_text_rag", persist_dir=persist_dir)._collection
+    bench.measure("numpy_store_export", scale,
+                  lambda: NumpyVectorStore.from_chroma(collection, os.path.join(persist_dir, NUMPY_STORE_DIR)),
+                  [()], len(split_text))
+
+    # Retrieval, per backend. Distinct query strings, so the query-embedding LRU does not hide the search
+    queries = [f"{QUESTIONS[i % len(QUESTIONS)]} ({i})" for i in range(n_queries)]
+    for backend in ("chroma", "numpy"):
+        def open_retriever():
+            return RelationalRetriever(
+                persist_dir=persist_dir, doc_store_path=doc_store_path, lineage_path=lineage_path,
+                warehouse_path=os.path.join(index_dir, "warehouse.sqlite"), backend=backend,
+                embedding_function=embeddings
+            )
+
+        with _quiet():
+            retriever = open_retriever()  # first open migrates the warehouse
+        bench.measure(f"retriever_init[{backend}]", scale, open_retriever, [()] * repeats, repeats)
+        bench.measure(f"retrieve[{backend}]", scale, lambda q: retriever.retrieve(q, max_cells=3),
+                      [(q,) for q in queries])
+        bench.measure(f"retrieve_many[{backend}]", scale,
+                      lambda qs: retriever.retrieve_many(qs, max_cells=3), [(queries,)], len(queries))
+
+    # Full question answering with a fake LLM (answer cache off, so every question is answered)
+    with _quiet():
+        bot = NotebookChatbot(answer_cache_threshold=None, retriever=retriever,
+                              llm=FakeListChatModel(responses=["The accuracy was 0.97 on the test set."]))
+    bench.measure("chatbot_ask[numpy]", scale, bot.ask, [(q,) for q in queries])
+
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.remove(notebook)
+
+
+def bench_codet5(bench: Bench):
+    """CodeT5Embeddings._embed on the bundled notebook's code (downloads the model on first use)."""
+    from codeEmbedder import CodeT5Embeddings
+
+    print("\n📏 CodeT5 embeddings")
+    with _quiet():
+        sources = [c["source"] for c in parse_notebook(NOTEBOOK) if c["type"] == "code" and c["source"].strip()]
+        model = CodeT5Embeddings()
+        model._embed(sources[:4])  # warm-up
+    bench.measure("codet5_embed", 1, model._embed, [(sources,)] * 3, len(sources) * 3)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Component benchmarks with offline embedding / LLM stand-ins.")
+    parser.add_argument("--scales", default=",".join(map(str, SCALES)),
+                        help="comma-separated corpus scale factors (default: 1,10,100,1000)")
+    parser.add_argument("--queries", type=int, default=50, help="questions per retrieval benchmark")
+    parser.add_argument("--codet5", action="store_true", help="also benchmark CodeT5Embeddings._embed")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="record per-component tracemalloc peaks (slows the timings down)")
+    parser.add_argument("--output", default=OUTPUT)
+    args = parser.parse_args()
+
+    bench = Bench(trace_memory=args.trace_memory)
+    embeddings = DeterministicFakeEmbedding(size=EMBED_DIM)
+
+    workdir = tempfile.mkdtemp(prefix="nbrag_bench_")
+    try:
+        for scale in (int(s) for s in args.scales.split(",")):
+            bench_scale(bench, scale, workdir, args.queries, embeddings)
+        if args.codet5:
+            bench_codet5(bench)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedding_dim": EMBED_DIM,
+            "queries": args.queries,
+        },
+        "results": bench.results,
+    }
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Benchmark results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
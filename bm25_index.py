@@ -0,0 +1,123 @@
+# bm25_index.py: in-process BM25 inverted index over the cell warehouse, fused with the vector hits
+# by reciprocal-rank fusion. Catches exact identifiers (SVC, GridSearchCV, column names) that dense
+# embeddings tend to miss.
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+BM25_FILENAME = "bm25_index.json"
+
+# Warehouse fields that are indexed
+INDEXED_FIELDS = ("source", "purpose", "explanation", "called_symbols")
+
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+(?:\.\d+)?")
+_SUBWORD = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on",
+    "or", "that", "the", "this", "to", "was", "what", "which", "with", "does", "did", "how", "why",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased identifier-aware tokens. Each identifier is kept whole and also split into its
+    camelCase/snake_case parts: "GridSearchCV" -> gridsearchcv, grid, search, cv.
+    """
+    tokens = []
+    for word in _WORD.findall(text):
+        lower = word.lower()
+        if lower in STOPWORDS:
+            continue
+        tokens.append(lower)
+
+        parts = [p.lower() for piece in word.split("_") for p in _SUBWORD.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p not in STOPWORDS)
+    return tokens
+
+
+def _cell_text(cell: Dict) -> str:
+    values = []
+    for field in INDEXED_FIELDS:
+        value = cell.get(field, "")
+        values.append(" ".join(value) if isinstance(value, list) else str(value or ""))
+    return "\n".join(values)
+
+
+class BM25Index:
+    def __init__(self, cell_ids: List[str], doc_lengths: List[int], postings: Dict[str, List[int]],
+                 k1: float = 1.5, b: float = 0.75):
+        """
+        postings maps a term to a flat [doc, tf, doc, tf, ...] list, where doc is a position in cell_ids.
+        """
+        self.cell_ids = cell_ids
+        self.doc_lengths = doc_lengths
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.avg_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, cells: List[Dict], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        cell_ids, doc_lengths, postings = [], [], {}
+
+        for position, cell in enumerate(cells):
+            tokens = tokenize(_cell_text(cell))
+            cell_ids.append(cell["cell_id"])
+            doc_lengths.append(len(tokens))
+
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).extend((position, tf))
+
+        print(f"📇 BM25 index built: {len(cell_ids)} cells, {len(postings)} terms")
+        return cls(cell_ids, doc_lengths, postings, k1, b)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "cell_ids": self.cell_ids,
+                "doc_lengths": self.doc_lengths,
+                "postings": self.postings,
+            }, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["cell_ids"], data["doc_lengths"], data["postings"], data["k1"], data["b"])
+
+    def search(self, query: str, k: int = 15) -> List[Tuple[str, float]]:
+        """Top-k (cell_id, score) pairs for the query."""
+        n_docs = len(self.cell_ids)
+        scores = Counter()
+
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+
+            df = len(posting) // 2
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+            for i in range(0, len(posting), 2):
+                doc, tf = posting[i], posting[i + 1]
+                norm = 1 - self.b + self.b * self.doc_lengths[doc] / self.avg_length
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+
+        return [(self.cell_ids[doc], score) for doc, score in scores.most_common(k)]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """Fuses several ranked lists of cell_ids: score(id) = sum over lists of 1 / (k + rank)."""
+    scores = Counter()
+    for ranking in rankings:
+        for rank, cell_id in enumerate(ranking, start=1):
+            scores[cell_id] += 1.0 / (k + rank)
+    return [cell_id for cell_id, _ in scores.most_common()]
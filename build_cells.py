@@ -1,13 +1,17 @@
 # 5 build_cells.py: final object is build here, once it's built, we convert this to standard RAG document object.
 from parser import parse_notebook
-from analyzer import analyze_code_cell
-from explainer import explain_cell
+from analyzer import analyze_cells
+from explainer import explain_cells
+from explain_cache import ExplanationCache
 from final_object_builder import assign_sections, build_final_object
 import json
 from pathlib import Path
 
 NOTEBOOK_PATH = "SVM Training and EDA.ipynb"
 OUTPUT_PATH = Path("artifacts/final_build_cell.json")
+EXPLAIN_CONCURRENCY = 4
+EXPLAIN_TIMEOUT = 300.0
+EXPLAIN_CACHE_DIR = "artifacts/explain_cache"
 
 # Ensure artifacts dir exists
 OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
@@ -22,12 +26,20 @@ parsed = assign_sections(parsed)
 
 final_cells = []
 
-# Step 3: Analyze, explain, and build final object
+# Step 3: Analyze, explain (concurrently), and build final object
 print("⚙️  Processing cells...")
-for i, p in enumerate(parsed):
-    print(f"  Processing cell {i + 1}/{len(parsed)}: {p.get('id', 'no-id')[:8]}...")
-    analyzed = analyze_code_cell(p.copy())
-    explained = explain_cell(analyzed.copy())
+explain_cache = ExplanationCache(EXPLAIN_CACHE_DIR)
+analyzed_cells = analyze_cells([p.copy() for p in parsed])
+explained_cells = explain_cells(
+    [a.copy() for a in analyzed_cells],
+    max_in_flight=EXPLAIN_CONCURRENCY,
+    timeout=EXPLAIN_TIMEOUT,
+    cache=explain_cache
+)
+print(f"🗄️ Explanation cache: {explain_cache.stats()}")
+
+# explain_cells returns cells ordered by cell_index, the same order parse_notebook produced
+for p, analyzed, explained in zip(parsed, analyzed_cells, explained_cells):
     final_cell = build_final_object(p, analyzed, explained)
     final_cells.append(final_cell)
 
@@ -0,0 +1,92 @@
+# build_corpus.py: multi-notebook version of build_index.py. Ingests every notebook under CORPUS_DIR
+# into one warehouse and one pair of Chroma collections, with cell ids namespaced by notebook.
+#
+# Usage: python build_corpus.py [corpus_dir]
+import json
+import sys
+import time
+
+from corpus_ingest import ingest_corpus
+from explainer import explain_cells
+from explain_cache import ExplanationCache
+from final_object_builder import build_final_object
+from storage import save, load, exists
+from warehouse import CellWarehouse, WAREHOUSE_PATH
+import tracing
+
+CORPUS_DIR = "notebooks"
+MAX_WORKERS = None  # defaults to os.cpu_count()
+
+FINAL = "artifacts/custom_object.json"
+REPORT = "artifacts/corpus_report.json"
+METRICS = "artifacts/metrics.prom"  # written when tracing is on (NBRAG_TRACE=1)
+
+EXPLAIN_CONCURRENCY = 4
+EXPLAIN_TIMEOUT = 300.0
+EXPLAIN_CACHE_DIR = "artifacts/explain_cache"
+INCREMENTAL = True
+
+
+if __name__ == "__main__":
+    # Imported here so process-pool workers (which re-import this module on spawn)
+    # never load torch/transformers or the Chroma client.
+    from build_index import index_custom_object
+    from index_builder import PERSIST_DIR
+
+    corpus_dir = sys.argv[1] if len(sys.argv) > 1 else CORPUS_DIR
+
+    # Stage 1: parse + sections + AST analysis, one notebook per worker process
+    start = time.perf_counter()
+    code_cells, report = ingest_corpus(corpus_dir, max_workers=MAX_WORKERS)
+    ingest_seconds = time.perf_counter() - start
+
+    # Stage 2: LLM explanations for the whole corpus, concurrently and cached
+    start = time.perf_counter()
+    explain_cache = ExplanationCache(EXPLAIN_CACHE_DIR)
+    explained_cells = explain_cells(
+        code_cells,
+        max_in_flight=EXPLAIN_CONCURRENCY,
+        timeout=EXPLAIN_TIMEOUT,
+        cache=explain_cache
+    )
+    explain_seconds = time.perf_counter() - start
+    print(f"🗄️ Explanation cache: {explain_cache.stats()}")
+
+    custom_doc_object = {}
+    for cell in explained_cells:
+        cell_obj = build_final_object(cell, cell, cell)
+        custom_doc_object[cell_obj["cell_id"]] = cell_obj
+
+    previous_object = load(FINAL) if INCREMENTAL and exists(FINAL) and exists(PERSIST_DIR) else None
+
+    print(f"💾 Saving {len(custom_doc_object)} code cells to {FINAL}...")
+    with open(FINAL, "w", encoding="utf-8") as f:
+        json.dump(custom_doc_object, f, indent=4)
+    CellWarehouse(WAREHOUSE_PATH).write(custom_doc_object, source_path=FINAL)
+
+    # Stage 3: documents, splitting and both Chroma collections
+    start = time.perf_counter()
+    index_custom_object(custom_doc_object, previous_object)
+    index_seconds = time.perf_counter() - start
+
+    total_cells = sum(r["n_cells"] for r in report)
+    save({
+        "corpus_dir": corpus_dir,
+        "notebooks": report,
+        "stages": {
+            "ingest_seconds": round(ingest_seconds, 3),
+            "explain_seconds": round(explain_seconds, 3),
+            "index_seconds": round(index_seconds, 3),
+        },
+        "total_cells": total_cells,
+        "total_code_cells": len(custom_doc_object),
+        "explain_cache": explain_cache.stats(),
+    }, REPORT)
+
+    print(f"📊 Ingested {len(report)} notebooks / {total_cells} cells "
+          f"(ingest {ingest_seconds:.1f}s, explain {explain_seconds:.1f}s, index {index_seconds:.1f}s)")
+    print(f"📊 Per-notebook throughput written to {REPORT}")
+
+    if tracing.is_enabled():
+        tracing.write_prometheus(METRICS)
+        print(f"⏱️ Stage timings: {tracing.summary()}")
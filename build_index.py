@@ -1,12 +1,19 @@
 # In this, all the pre-built user defined functions are called and used here, to make the embeddings and
 # store them in a vector store
 from parser import parse_notebook
-from analyzer import analyze_code_cell
-from explainer import explain_cell
+from analyzer import analyze_cells
+from explainer import explain_cells
+from explain_cache import ExplanationCache
 from final_object_builder import assign_sections, build_final_object
 from langchain_ollama import OllamaEmbeddings
 from codeEmbedder import CodeT5Embeddings
-from index_builder import build_collection
+from embedding_cache import CachedEmbeddings
+from lineage import build_lineage_index, save_lineage_index, LINEAGE_PATH
+from bm25_index import BM25Index, BM25_FILENAME
+from numpy_store import NumpyVectorStore, NUMPY_STORE_DIR
+from warehouse import CellWarehouse, WAREHOUSE_PATH
+import tracing
+from index_builder import build_collection, update_collection, diff_custom_objects, PERSIST_DIR
 from rag_document_builder import build_rag_documents
 from rag_text_splitter import split_text_documents, split_code_documents
 from storage import (
@@ -18,6 +25,7 @@ from storage import (
 )
 from langchain_core.documents import Document
 import json
+import os
 
 
 
@@ -28,36 +36,44 @@ ANALYZED = "artifacts/analyzed_cells.json"
 EXPLAINED = "artifacts/explained_cells.json"
 FINAL = "artifacts/custom_object.json"
 RAG_DOCS = "artifacts/rag_documents.json"
+METRICS = "artifacts/metrics.prom"  # written when tracing is on (NBRAG_TRACE=1)
 
-if __name__ == "__main__":
-    print("Parsing Starts...")
-    raw_cells = parse_notebook(NOTEBOOK)
-    assigned_cells = assign_sections(raw_cells)
-    custom_doc_object = {}
-    print("Building Custom Document Object...")
-    for cell in assigned_cells:
-        if cell["type"] == "code":
-            analyzed_cell = analyze_code_cell(cell)
+# Worker processes for AST analysis (1 = in-process, enough for a single notebook)
+ANALYZE_WORKERS = 1
 
-            explained_cell = explain_cell(analyzed_cell)
+# Concurrent explain settings: keep EXPLAIN_CONCURRENCY in line with OLLAMA_NUM_PARALLEL
+EXPLAIN_CONCURRENCY = 4
+EXPLAIN_TIMEOUT = 300.0  # seconds per LLM call
+EXPLAIN_CACHE_DIR = "artifacts/explain_cache"
 
+# Incremental mode: diff against the previous custom object and only re-embed added/changed cells.
+# Set to False to rebuild both collections from the full corpus.
+INCREMENTAL = True
 
-            cell_obj = build_final_object(cell, analyzed_cell, explained_cell)
+# CodeT5 precision: "fp32", "int8" or "bf16". Run `python codeEmbedder.py` to see the drift of each mode.
+CODE_EMBED_PRECISION = "fp32"
 
-            custom_doc_object[cell_obj["cell_id"]] = cell_obj
-    print(f"💾 Saving {len(custom_doc_object)} code cells to {FINAL}...")
-    with open(FINAL, "w", encoding="utf-8") as f:
-        json.dump(custom_doc_object, f, indent=4)
+# Also export the text collection as a NumPy flat index (RelationalRetriever(backend="numpy"))
+EXPORT_NUMPY_STORE = True
 
-    print("Printing Custom Object:")
-    print(json.dumps(custom_doc_object, indent=4))
+# Shared on-disk vector cache for both embedding models
+EMBEDDING_CACHE = "artifacts/embedding_cache.sqlite"
+TEXT_EMBED_MODEL = "bge-m3"
 
-    print(40*"=", "✅ Custom Object formed!", 40*"=")
 
-    ########################################################################################################
+def index_custom_object(custom_doc_object: dict, previous_object: dict | None = None):
+    """
+    Builds the lineage and BM25 indexes and the RAG documents for a custom object, splits them and writes
+    both Chroma collections.
+    When previous_object is given, only the cells that differ from it are re-embedded.
+    """
+    print("🧬 Building cell lineage index...")
+    save_lineage_index(build_lineage_index(list(custom_doc_object.values())), LINEAGE_PATH)
 
-    print("🗂️ Starting Indexing...")
+    print("📇 Building BM25 lexical index...")
+    BM25Index.build(list(custom_doc_object.values())).save(os.path.join(PERSIST_DIR, BM25_FILENAME))
 
+    print("🗂️ Starting Indexing...")
 
     code_docs, text_docs = build_rag_documents(list(custom_doc_object.values()))
 
@@ -73,21 +89,104 @@ if __name__ == "__main__":
     save_documents(split_text_docs, "artifacts/split_text_docs.json")
 
     print("Starting saving the split chunks in the VectorDB...")
-    embeddings = CodeT5Embeddings()
-
-    # Build text collection
-    text_db = build_collection(
-        documents=split_text_docs,
-        embedding_model=OllamaEmbeddings(model="bge-m3"),
-        collection_name="notebook_text_rag"
+    text_embeddings = CachedEmbeddings(
+        OllamaEmbeddings(model=TEXT_EMBED_MODEL),
+        model_id=f"ollama:{TEXT_EMBED_MODEL}",
+        cache_path=EMBEDDING_CACHE
     )
-
-    # Build code collection
-    code_db = build_collection(
-        documents=split_code_docs,
-        embedding_model=CodeT5Embeddings(),
-        collection_name="notebook_code_rag"
+    code_model = CodeT5Embeddings(precision=CODE_EMBED_PRECISION)
+    embeddings = CachedEmbeddings(
+        code_model,
+        model_id=f"codet5:{code_model.model_name}:{code_model.precision}",
+        cache_path=EMBEDDING_CACHE
     )
 
+    if previous_object is not None:
+        diff = diff_custom_objects(previous_object, custom_doc_object)
+        print(f"🔁 Incremental re-index: {len(diff['added'])} added, "
+              f"{len(diff['changed'])} changed, {len(diff['removed'])} removed cells")
+
+        text_db = update_collection(
+            documents=split_text_docs,
+            embedding_model=text_embeddings,
+            collection_name="notebook_text_rag",
+            diff=diff
+        )
+
+        code_db = update_collection(
+            documents=split_code_docs,
+            embedding_model=embeddings,
+            collection_name="notebook_code_rag",
+            diff=diff
+        )
+    else:
+        # Build text collection
+        text_db = build_collection(
+            documents=split_text_docs,
+            embedding_model=text_embeddings,
+            collection_name="notebook_text_rag"
+        )
+
+        # Build code collection
+        code_db = build_collection(
+            documents=split_code_docs,
+            embedding_model=embeddings,
+            collection_name="notebook_code_rag"
+        )
+
+    if EXPORT_NUMPY_STORE:
+        # Reuses the vectors already stored in Chroma, nothing is re-embedded
+        NumpyVectorStore.from_chroma(text_db._collection, os.path.join(PERSIST_DIR, NUMPY_STORE_DIR))
+
+    print(f"🗄️ Embedding cache: {text_embeddings.stats()} | {embeddings.stats()}")
     print("Vector Database created successfully and embeddings are stored")
     print("Indexing completed!")
+    return text_db, code_db
+
+
+if __name__ == "__main__":
+    print("Parsing Starts...")
+    raw_cells = parse_notebook(NOTEBOOK)
+    assigned_cells = assign_sections(raw_cells)
+    custom_doc_object = {}
+    print("Building Custom Document Object...")
+    explain_cache = ExplanationCache(EXPLAIN_CACHE_DIR)
+    analyzed_cells = analyze_cells(
+        [cell for cell in assigned_cells if cell["type"] == "code"],
+        workers=ANALYZE_WORKERS
+    )
+
+    # Analyzed cells carry all parsed fields and explain_cells updates them in place,
+    # so each explained cell also carries its parsed and analyzed fields.
+    explained_cells = explain_cells(
+        analyzed_cells,
+        max_in_flight=EXPLAIN_CONCURRENCY,
+        timeout=EXPLAIN_TIMEOUT,
+        cache=explain_cache
+    )
+    print(f"🗄️ Explanation cache: {explain_cache.stats()}")
+
+    for cell in explained_cells:
+        cell_obj = build_final_object(cell, cell, cell)
+
+        custom_doc_object[cell_obj["cell_id"]] = cell_obj
+    # Keep the previous warehouse around for the incremental diff before it is overwritten
+    previous_object = load(FINAL) if INCREMENTAL and exists(FINAL) and exists(PERSIST_DIR) else None
+
+    print(f"💾 Saving {len(custom_doc_object)} code cells to {FINAL}...")
+    with open(FINAL, "w", encoding="utf-8") as f:
+        json.dump(custom_doc_object, f, indent=4)
+    CellWarehouse(WAREHOUSE_PATH).write(custom_doc_object, source_path=FINAL)
+
+    print("Printing Custom Object:")
+    print(json.dumps(custom_doc_object, indent=4))
+
+    print(40*"=", "✅ Custom Object formed!", 40*"=")
+
+    ########################################################################################################
+
+    index_custom_object(custom_doc_object, previous_object)
+
+    if tracing.is_enabled():
+        tracing.write_prometheus(METRICS)
+        print(f"⏱️ Stage timings: {tracing.summary()}")
@@ -1,8 +1,13 @@
+import json
+import os
+import time
 import torch
 from transformers import AutoModel, AutoTokenizer
 from langchain_core.embeddings import Embeddings
 from typing import List
 
+PRECISIONS = ("fp32", "int8", "bf16")
+
 
 class CodeT5Embeddings(Embeddings):
     """
@@ -10,11 +15,24 @@ class CodeT5Embeddings(Embeddings):
     Optimized for CPU inference on Windows laptops with limited VRAM.
     """
 
-    def __init__(self, model_name="Salesforce/codet5p-110m-embedding"):
+    def __init__(self, model_name="Salesforce/codet5p-110m-embedding", batch_size: int = 16,
+                 num_threads: int | None = None, precision: str = "fp32"):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+
         # Explicitly use CPU to avoid 128MB VRAM bottlenecks
         self.device = "cpu"
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.precision = precision
+
+        # Intra-op threads used by each forward pass. Set it explicitly when several
+        # embedding processes share a machine, so they do not oversubscribe the cores.
+        if num_threads:
+            torch.set_num_threads(num_threads)
 
-        print(f"Initializing {model_name} on {self.device}...")
+        print(f"Initializing {model_name} on {self.device} "
+              f"(precision={precision}, batch_size={batch_size}, threads={torch.get_num_threads()})...")
 
         self.tokenizer = AutoTokenizer.from_pretrained(
             model_name,
@@ -27,23 +45,43 @@ class CodeT5Embeddings(Embeddings):
 
         self.model.eval()
 
+        # Reduced-precision CPU modes. Use check_drift() to compare them against fp32.
+        if precision == "int8":
+            # Dynamic quantization: Linear weights stored as int8, activations quantized on the fly
+            self.model = torch.ao.quantization.quantize_dynamic(
+                self.model,
+                {torch.nn.Linear},
+                dtype=torch.qint8
+            )
+        elif precision == "bf16":
+            self.model = self.model.to(torch.bfloat16)
+
     def _embed(self, texts: List[str]) -> List[List[float]]:
-        embeddings = []
-        with torch.no_grad():
-            for text in texts:
+        embeddings = [None] * len(texts)
+
+        # Sort by length so each batch holds similarly sized texts and padding stays small
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+
+        with torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                batch_ids = order[start:start + self.batch_size]
+
                 # Truncate to 512 to stay within model limits
                 inputs = self.tokenizer(
-                    text,
+                    [texts[i] for i in batch_ids],
                     return_tensors="pt",
                     truncation=True,
                     padding=True,
                     max_length=512
                 ).to(self.device)
 
-                # The model outputs 256-dimensional normalized embeddings
+                # The model outputs 256-dimensional normalized embeddings, one row per text
                 result = self.model(**inputs)
-                embedding = result.detach().cpu().numpy()[0]
-                embeddings.append(embedding.tolist())
+                # bf16 has no numpy dtype, so always hand back fp32 values
+                for i, embedding in zip(batch_ids, result.float().cpu().numpy()):
+                    embeddings[i] = embedding.tolist()
+
+        # Results go back in input order
         return embeddings
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
@@ -52,4 +90,52 @@ class CodeT5Embeddings(Embeddings):
 
     def embed_query(self, text: str) -> List[float]:
         """Embed a single user question."""
-        return self._embed([text])[0]
\ No newline at end of file
+        return self._embed([text])[0]
+
+    def check_drift(self, sample_texts: List[str], reference: "CodeT5Embeddings | None" = None) -> dict:
+        """
+        Measures how far this precision mode drifts from fp32 on a sample set.
+        Returns the mean/min cosine similarity between both embeddings of every sample text.
+        """
+        if reference is None:
+            reference = CodeT5Embeddings(self.model_name, batch_size=self.batch_size, precision="fp32")
+
+        ours = torch.tensor(self._embed(sample_texts))
+        ref = torch.tensor(reference._embed(sample_texts))
+        cosine = torch.nn.functional.cosine_similarity(ours, ref, dim=1)
+
+        return {
+            "precision": self.precision,
+            "n_samples": len(sample_texts),
+            "mean_cosine": round(cosine.mean().item(), 5),
+            "min_cosine": round(cosine.min().item(), 5),
+        }
+
+
+SAMPLE_CODE = [
+    "import pandas as pd\ndf = pd.read_csv('data.csv')\ndf.head()",
+    "from sklearn.svm import SVC\nmodel = SVC(kernel='rbf', C=1.0)\nmodel.fit(X_train, y_train)",
+    "from sklearn.metrics import accuracy_score\nprint(accuracy_score(y_test, model.predict(X_test)))",
+    "import matplotlib.pyplot as plt\nplt.scatter(X[:, 0], X[:, 1], c=y)\nplt.show()",
+]
+
+
+if __name__ == "__main__":
+    # Compare every precision mode against fp32 on the indexed code chunks (or a small built-in sample)
+    if os.path.exists("artifacts/split_code_docs.json"):
+        with open("artifacts/split_code_docs.json", "r", encoding="utf-8") as f:
+            samples = [d["page_content"] for d in json.load(f)][:64]
+    else:
+        samples = SAMPLE_CODE
+
+    fp32 = CodeT5Embeddings(precision="fp32")
+    for mode in PRECISIONS:
+        embedder = fp32 if mode == "fp32" else CodeT5Embeddings(precision=mode)
+
+        start = time.perf_counter()
+        embedder._embed(samples)
+        seconds = time.perf_counter() - start
+
+        report = embedder.check_drift(samples, reference=fp32)
+        report["seconds"] = round(seconds, 3)
+        print(report)
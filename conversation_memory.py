@@ -0,0 +1,157 @@
+# conversation_memory.py: bounded chat memory for NotebookChatbot. The last few turns stay verbatim,
+# older turns are folded into a rolling summary (one LLM call per fold, never per prompt), and the
+# rendered memory is kept under a hard token cap.
+import time
+from collections import deque
+from typing import List, Tuple
+
+from context_packer import clip_to_tokens, count_tokens
+import tracing
+
+SUMMARY_PROMPT = """You maintain the running summary of a conversation between a user and an assistant
+about a Jupyter notebook. Update the summary with the new turns below. Keep the facts the user may
+refer back to: which cells, variables, models, metrics and numbers were discussed, and open questions.
+Write plain sentences, at most {max_words} words. Reply with the summary only.
+
+CURRENT SUMMARY:
+{summary}
+
+NEW TURNS:
+{turns}"""
+
+_CLIPPED = "... [clipped]"
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    """Cuts text to roughly max_tokens, at a line or word boundary (same rule as the context packer)."""
+    return clip_to_tokens(text, max_tokens, marker=_CLIPPED)
+
+
+class ConversationMemory:
+    """
+    Args:
+        llm: Chat model used to fold old turns into the summary; None uses an extractive summary
+             (the earlier questions) instead of an LLM call.
+        recent_turns: Question/answer pairs kept verbatim.
+        fold_every: Old turns are folded in batches of this size, to keep summary calls rare.
+        max_tokens: Hard cap on the rendered memory.
+        max_turns: Raw turns kept for chat_history; older ones are evicted.
+    """
+
+    def __init__(self, llm=None, recent_turns: int = 2, fold_every: int = 2, max_tokens: int = 1200,
+                 max_turns: int = 50):
+        self.llm = llm
+        self.recent_turns = recent_turns
+        self.fold_every = fold_every
+        self.max_tokens = max_tokens
+
+        self.turns = deque(maxlen=max_turns)  # (user, assistant), raw log
+        self.summary = ""
+        self._unfolded = []  # turns that left the verbatim window but are not summarized yet
+        self.folds = 0
+
+    # --------------------------------------------------
+    # History
+    # --------------------------------------------------
+    def add(self, user_message: str, assistant_message: str):
+        self.turns.append((user_message, assistant_message))
+
+        # Everything older than the verbatim window waits to be folded into the summary
+        if len(self.turns) > self.recent_turns:
+            self._unfolded.append(self.turns[-self.recent_turns - 1])
+
+    def clear(self):
+        self.turns.clear()
+        self.summary = ""
+        self._unfolded = []
+
+    @property
+    def chat_history(self) -> List[Tuple[str, str]]:
+        """The raw (role, message) list the chatbot used to keep."""
+        history = []
+        for user_message, assistant_message in self.turns:
+            history.append(("User", user_message))
+            history.append(("Assistant", assistant_message))
+        return history
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    # --------------------------------------------------
+    # Summary
+    # --------------------------------------------------
+    def _fold(self):
+        """Merges the pending old turns into the summary with one LLM call."""
+        turns = "\n\n".join(f"User: {u}\nAssistant: {a}" for u, a in self._unfolded)
+        summary_budget = self.max_tokens // 3
+
+        if self.llm is not None:
+            prompt = SUMMARY_PROMPT.format(
+                max_words=int(summary_budget * 0.75),
+                summary=self.summary or "(empty)",
+                turns=turns
+            )
+            try:
+                start = time.perf_counter()
+                response = self.llm.invoke(prompt)
+                tracing.observe("llm_call_seconds", time.perf_counter() - start, stage="summary")
+                tracing.record_llm_usage(response, "summary")
+                summary = response.content.strip()
+            except Exception as e:
+                print(f"⚠️ Memory summary failed, keeping an extractive summary: {e}")
+                summary = None
+        else:
+            summary = None
+
+        if summary is None:
+            asked = "\n".join(f"- Earlier question: {u}" for u, _ in self._unfolded)
+            summary = f"{self.summary}\n{asked}".strip()
+
+        self.summary = _clip(summary, summary_budget)
+        self._unfolded = []
+        self.folds += 1
+
+    def render(self) -> str:
+        """The memory block for the prompt: summary + recent turns, under max_tokens."""
+        if not self.turns:
+            return "No previous conversation."
+
+        if len(self._unfolded) >= self.fold_every:
+            self._fold()
+
+        # Turns waiting for the next fold are shown clipped, the recent ones verbatim
+        recent = list(self.turns)[-self.recent_turns:] if self.recent_turns else []
+        waiting = [(u, _clip(a, 80)) for u, a in self._unfolded]
+        turns = waiting + recent
+
+        header = "--- PREVIOUS CONVERSATION HISTORY ---\n"
+        summary = f"Summary of the earlier conversation:\n{self.summary}\n\n" if self.summary else ""
+        budget = self.max_tokens - count_tokens(header + summary)
+
+        # Oldest answers are clipped first until everything fits
+        lines = [(f"User: {u}", f"Assistant: {a}") for u, a in turns]
+        cost = sum(count_tokens(q) + count_tokens(a) for q, a in lines)
+        for i in range(len(lines)):
+            if cost <= budget:
+                break
+            question, answer = lines[i]
+            cost -= count_tokens(answer)
+            answer = _clip(answer, max(budget // (2 * len(lines)), 20))
+            cost += count_tokens(answer)
+            lines[i] = (question, answer)
+
+        # Still over (very long questions): drop the oldest turns
+        while lines and cost > budget:
+            question, answer = lines.pop(0)
+            cost -= count_tokens(question) + count_tokens(answer)
+
+        body = "".join(f"{question}\n\n{answer}\n\n" for question, answer in lines)
+        return (header + summary + body).strip()
+
+    def stats(self) -> dict:
+        return {
+            "turns": len(self.turns),
+            "pending_fold": len(self._unfolded),
+            "folds": self.folds,
+            "summary_tokens": count_tokens(self.summary),
+        }
@@ -0,0 +1,102 @@
+# corpus_ingest.py: fans parse_notebook + assign_sections + analyze_code_cell out across a process pool
+# so a whole directory tree of notebooks can be ingested at once.
+# Workers only import parser and analyzer (nbformat, ast, stdlib): no LLM client, embeddings or
+# vector store is loaded in the pool, so worker processes start fast.
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List
+
+from parser import parse_notebook, namespace_cell_ids, assign_sections
+from analyzer import analyze_code_cell
+import tracing
+
+
+def find_notebooks(root: str) -> List[str]:
+    """All .ipynb files under root, skipping Jupyter checkpoint copies."""
+    return sorted(
+        str(p) for p in Path(root).rglob("*.ipynb")
+        if ".ipynb_checkpoints" not in p.parts
+    )
+
+
+def prepare_notebook(path: str, root: str) -> Dict:
+    """
+    Worker: parse, section and analyze one notebook.
+    Cell ids are namespaced by the notebook path relative to the corpus root.
+    """
+    start = time.perf_counter()
+    notebook_path = Path(path).relative_to(root).as_posix()
+
+    try:
+        cells = parse_notebook(path, streaming=True)
+    except Exception as e:
+        return {"notebook_path": notebook_path, "cells": [], "n_cells": 0,
+                "seconds": time.perf_counter() - start, "error": f"{type(e).__name__}: {e}"}
+
+    cells = namespace_cell_ids(cells, notebook_path)
+    cells = assign_sections(cells)
+    code_cells = [analyze_code_cell(c) for c in cells if c["type"] == "code"]
+
+    return {
+        "notebook_path": notebook_path,
+        "cells": code_cells,
+        "n_cells": len(cells),
+        "seconds": time.perf_counter() - start,
+        "error": None,
+    }
+
+
+def _prepare_in_worker(path: str, root: str) -> Dict:
+    """prepare_notebook plus the worker's spans and metrics, which the parent merges into its own."""
+    result = prepare_notebook(path, root)
+    result["trace"] = tracing.drain()
+    return result
+
+
+def ingest_corpus(root: str, max_workers: int | None = None) -> tuple[List[Dict], List[Dict]]:
+    """
+    Runs prepare_notebook for every notebook under root across a process pool.
+
+    Returns:
+        (code_cells, report) where code_cells are the analyzed code cells of the whole corpus
+        in notebook/cell_index order, and report holds per-notebook throughput.
+    """
+    notebooks = find_notebooks(root)
+    max_workers = max_workers or os.cpu_count() or 1
+    print(f"📚 Found {len(notebooks)} notebooks under {root} ({max_workers} workers)")
+
+    results = {}
+    # Workers buffer their spans and metrics (see tracing.init_worker) and return them with each result
+    pool = ProcessPoolExecutor(max_workers=max_workers, initializer=tracing.init_worker,
+                               initargs=(tracing.is_enabled(),))
+    with tracing.span("corpus_ingest", notebooks=len(notebooks), workers=max_workers), pool:
+        futures = {pool.submit(_prepare_in_worker, path, root): path for path in notebooks}
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            tracing.merge(result.pop("trace"))
+            results[result["notebook_path"]] = result
+
+            if result["error"]:
+                print(f"  ❌ [{done}/{len(notebooks)}] {result['notebook_path']}: {result['error']}")
+            else:
+                rate = result["n_cells"] / result["seconds"] if result["seconds"] else 0.0
+                print(f"  ✅ [{done}/{len(notebooks)}] {result['notebook_path']}: "
+                      f"{result['n_cells']} cells in {result['seconds']:.2f}s ({rate:.0f} cells/s)")
+
+    code_cells, report = [], []
+    for notebook_path in sorted(results):
+        result = results[notebook_path]
+        code_cells.extend(result["cells"])
+        report.append({
+            "notebook_path": notebook_path,
+            "n_cells": result["n_cells"],
+            "n_code_cells": len(result["cells"]),
+            "seconds": round(result["seconds"], 4),
+            "cells_per_second": round(result["n_cells"] / result["seconds"], 1) if result["seconds"] else None,
+            "error": result["error"],
+        })
+
+    return code_cells, report
@@ -0,0 +1,100 @@
+# embedding_cache.py: a caching Embeddings wrapper that sits in front of CodeT5Embeddings or OllamaEmbeddings.
+# Vectors are stored on disk as raw float32 blobs in SQLite, keyed by a hash of (model id, text),
+# so unchanged chunks never reach the embedding model again across notebooks and rebuilds.
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import tracing
+
+CACHE_PATH = "artifacts/embedding_cache.sqlite"
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps any LangChain Embeddings model with a persistent vector cache.
+
+    Args:
+        underlying: The real embedding model
+        model_id: Identifies the model (and its settings) in the cache key, e.g. "ollama:bge-m3".
+                  Two models must never share a model_id.
+        cache_path: SQLite file shared by every model
+    """
+
+    def __init__(self, underlying: Embeddings, model_id: str, cache_path: str = CACHE_PATH):
+        self.underlying = underlying
+        self.model_id = model_id
+
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> dict:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, keys: List[str], vectors: List[List[float]]):
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in zip(keys, vectors)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(t) for t in texts]
+        found = self._lookup(list(set(keys)))
+
+        # Embed every distinct missing text once, in a single batch call
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        self.hits += len(texts) - sum(1 for k in keys if k in missing)
+        self.misses += len(missing)
+
+        if missing:
+            with tracing.span("embed", model=self.model_id, texts=len(missing)):
+                vectors = self.underlying.embed_documents(list(missing.values()))
+            tracing.count("embed_texts", len(missing), model=self.model_id)
+            self._store(list(missing.keys()), vectors)
+            found.update(zip(missing.keys(), vectors))
+
+        return [found[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Only document chunks are cached on disk; user questions are too varied to be worth storing
+        return self.underlying.embed_query(text)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "model_id": self.model_id,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,104 @@
+# explain_cache.py: content-addressed on-disk cache for LLM cell explanations, so unchanged cells skip the LLM.
+import hashlib
+import json
+import os
+from pathlib import Path
+
+CACHE_DIR = "artifacts/explain_cache"
+
+# The parsed fields explain_cell produces for a code cell
+CACHED_FIELDS = ("purpose", "explanation", "result_summary", "intent")
+
+
+def explanation_key(source: str, cleaned_output: str, system_prompt: str, model: str) -> str:
+    """Hash of everything that decides what the LLM is asked for a cell."""
+    payload = json.dumps([source, cleaned_output, system_prompt, model], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExplanationCache:
+    """
+    One small JSON file per explanation, stored as <cache_dir>/<key[:2]>/<key>.json.
+    When the cache grows past max_bytes, the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = 50 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+        self._total_bytes = sum(p.stat().st_size for p in self._entries())
+
+    def _entries(self):
+        return self.cache_dir.glob("*/*.json")
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> dict | None:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):  # ValueError: bad JSON or bad encoding
+            self.misses += 1
+            return None
+
+        # A partial or older-format entry is a miss: the cell is explained again and the entry rewritten
+        if not isinstance(entry, dict) or not all(isinstance(entry.get(k), str) for k in CACHED_FIELDS):
+            self.misses += 1
+            return None
+
+        # Refresh the access time so eviction keeps recently used entries
+        os.utime(path)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, fields: dict):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        old_size = path.stat().st_size if path.exists() else 0
+        data = json.dumps({k: fields.get(k, "") for k in CACHED_FIELDS}, ensure_ascii=False)
+
+        # Write to a temp file first so a crash never leaves a half-written entry
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        self._total_bytes += path.stat().st_size - old_size
+        self.writes += 1
+
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Drops least recently used entries until the cache is back under 90% of max_bytes."""
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(
+            ((p.stat().st_mtime, p.stat().st_size, p) for p in self._entries()),
+            key=lambda e: e[0]
+        )
+        for _, size, path in entries:
+            if self._total_bytes <= target:
+                break
+            path.unlink(missing_ok=True)
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "size_bytes": self._total_bytes,
+        }
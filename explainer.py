@@ -1,16 +1,16 @@
 # 3: explainer.py, LLM which sees the jupyter notebook each cell and generate a text explanation for each cell.
-from langchain_ollama import ChatOllama
 from langchain_core.messages import SystemMessage, HumanMessage
 from dotenv import load_dotenv
+from explain_cache import ExplanationCache, CACHED_FIELDS, explanation_key
+import asyncio
 import os
 import re
+import time
 
-load_dotenv()
+from llm_backends import get_llm
+import tracing
 
-llm = ChatOllama(
-    model="llama3:8b",
-    temperature=0
-)
+load_dotenv()
 
 
 # 1. NEW: The Output Cleaner is now a helper function inside the explainer
@@ -89,14 +89,15 @@ STRICT RULES:
 """
 
 
-def explain_cell(cell: dict) -> dict:
-    if cell["type"] != "code":
-        cell["purpose"] = "Narrative or section heading"
-        cell["explanation"] = cell["source"][:200] + "..." if len(cell["source"]) > 200 else cell["source"]
-        cell["result_summary"] = "None"
-        cell["intent"] = "narrative"
-        return cell
+def _explain_narrative(cell: dict) -> dict:
+    cell["purpose"] = "Narrative or section heading"
+    cell["explanation"] = cell["source"][:200] + "..." if len(cell["source"]) > 200 else cell["source"]
+    cell["result_summary"] = "None"
+    cell["intent"] = "narrative"
+    return cell
+
 
+def _build_messages(cell: dict) -> list:
     code = cell.get("source", "")
     used = ", ".join(cell.get("used", []))
     defined = ", ".join(cell.get("defined", []))
@@ -120,12 +121,23 @@ def explain_cell(cell: dict) -> dict:
     {safe_output}
     """
 
-    response = llm.invoke([
+    return [
         SystemMessage(content=SYSTEM_PROMPT),
         HumanMessage(content=prompt)
-    ])
+    ]
 
-    content = response.content.strip()
+
+def _mark_failed(cell: dict, result_summary: str) -> dict:
+    cell["purpose"] = "Unclear code block"
+    cell["explanation"] = "The model could not reliably extract the intent of this cell."
+    cell["result_summary"] = result_summary
+    cell["intent"] = "other"
+    cell["explanation_error"] = True
+    return cell
+
+
+def _apply_response(cell: dict, content: str) -> dict:
+    content = content.strip()
 
     # 5. UPDATED: Regex parser now hunts for the RESULT block too
     what_match = re.search(r'WHAT:\s*(.*?)(?=\nWHY:|$)', content, re.IGNORECASE | re.DOTALL)
@@ -134,12 +146,7 @@ def explain_cell(cell: dict) -> dict:
     tag_match = re.search(r'TAG:\s*(\w+)', content, re.IGNORECASE)
 
     if not (what_match and why_match and result_match and tag_match):
-        cell["purpose"] = "Unclear code block"
-        cell["explanation"] = "The model could not reliably extract the intent of this cell."
-        cell["result_summary"] = "Parsing failed."
-        cell["intent"] = "other"
-        cell["explanation_error"] = True
-        return cell
+        return _mark_failed(cell, "Parsing failed.")
 
     cell["purpose"] = what_match.group(1).strip()
     cell["explanation"] = why_match.group(1).strip()
@@ -147,4 +154,135 @@ def explain_cell(cell: dict) -> dict:
     cell["intent"] = tag_match.group(1).lower()
     cell["explanation_error"] = False
 
-    return cell
\ No newline at end of file
+    return cell
+
+
+def _llm():
+    """
+    The shared, retrying model from the backend registry (ollama llama3:8b unless NBRAG_EXPLAIN_BACKEND
+    is set), built on first use so importing this module needs no LLM backend.
+    """
+    return get_llm("explain")
+
+
+def _cache_key(cell: dict) -> str:
+    return explanation_key(
+        cell.get("source", ""),
+        clean_cell_output(cell.get("outputs", [])),
+        SYSTEM_PROMPT,
+        _llm().model
+    )
+
+
+def _apply_cached(cell: dict, cache: ExplanationCache | None) -> bool:
+    """Fills the cell from the cache. Returns True on a hit."""
+    if cache is None:
+        return False
+
+    entry = cache.get(_cache_key(cell))
+    if entry is None:
+        return False
+
+    for field in CACHED_FIELDS:
+        cell[field] = entry[field]
+    cell["explanation_error"] = False
+    return True
+
+
+def _store_cached(cell: dict, cache: ExplanationCache | None):
+    # Failed or timed-out explanations are not cached, so the next run retries them
+    if cache is not None and not cell.get("explanation_error"):
+        cache.put(_cache_key(cell), cell)
+
+
+def explain_cell(cell: dict, cache: ExplanationCache | None = None) -> dict:
+    if cell["type"] != "code":
+        return _explain_narrative(cell)
+
+    if _apply_cached(cell, cache):
+        return cell
+
+    llm = _llm()
+    start = time.perf_counter()
+    response = llm.invoke(_build_messages(cell))
+    tracing.observe("llm_call_seconds", time.perf_counter() - start, stage="explain", model=llm.model)
+    tracing.record_llm_usage(response, "explain", llm.model)
+
+    cell = _apply_response(cell, response.content)
+    _store_cached(cell, cache)
+    return cell
+
+
+# --------------------------------------------------
+# Concurrent explain mode
+# --------------------------------------------------
+# A single Ollama server only answers requests in parallel when it is started
+# with OLLAMA_NUM_PARALLEL > 1; max_in_flight should match that slot count.
+async def aexplain_cell(cell: dict, timeout: float | None = None, cache: ExplanationCache | None = None) -> dict:
+    """
+    Async version of explain_cell. Each attempt gets `timeout` seconds (transient failures are retried);
+    a cell whose last attempt times out or fails is marked as failed.
+    """
+    if cell["type"] != "code":
+        return _explain_narrative(cell)
+
+    if _apply_cached(cell, cache):
+        return cell
+
+    llm = _llm()
+    start = time.perf_counter()
+    try:
+        response = await llm.ainvoke(_build_messages(cell), attempt_timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"⏱️ Explanation timed out for cell {cell.get('id', 'no-id')}")
+        tracing.count("llm_timeouts", stage="explain", model=llm.model)
+        return _mark_failed(cell, "Explanation timed out.")
+    except Exception as e:
+        # One failing cell (connection error, 5xx, ...) must not abort the batch in aexplain_cells
+        print(f"⚠️ Explanation failed for cell {cell.get('id', 'no-id')}: {type(e).__name__}: {e}")
+        tracing.count("llm_errors", stage="explain", model=llm.model, error=type(e).__name__)
+        return _mark_failed(cell, f"Explanation failed: {type(e).__name__}.")
+    tracing.observe("llm_call_seconds", time.perf_counter() - start, stage="explain", model=llm.model)
+    tracing.record_llm_usage(response, "explain", llm.model)
+
+    cell = _apply_response(cell, response.content)
+    _store_cached(cell, cache)
+    return cell
+
+
+async def aexplain_cells(
+        cells: list,
+        max_in_flight: int = 4,
+        timeout: float | None = 120.0,
+        cache: ExplanationCache | None = None
+) -> list:
+    """
+    Explains many cells concurrently with at most `max_in_flight` LLM calls running at once.
+    Cells are updated in place and returned in notebook order (notebook_path, then cell_index).
+    A cell whose LLM call fails is marked as failed; the other cells keep their explanations.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_in_flight))
+    done = 0
+
+    async def run(cell):
+        nonlocal done
+        async with semaphore:
+            result = await aexplain_cell(cell, timeout=timeout, cache=cache)
+        done += 1
+        print(f"  Explained cell {done}/{len(cells)}: {cell.get('id', 'no-id')[:8]}...")
+        return result
+
+    explained = await asyncio.gather(*(run(cell) for cell in cells))
+
+    return sorted(explained, key=lambda c: (c.get("notebook_path") or "", c.get("cell_index", -1)))
+
+
+def explain_cells(
+        cells: list,
+        max_in_flight: int = 4,
+        timeout: float | None = 120.0,
+        cache: ExplanationCache | None = None
+) -> list:
+    """Blocking entry point for aexplain_cells, used by the build scripts."""
+    with tracing.span("explain", cells=len(cells), max_in_flight=max_in_flight):
+        return asyncio.run(aexplain_cells(cells, max_in_flight=max_in_flight, timeout=timeout, cache=cache))
@@ -1,18 +1,7 @@
 # 4: final_object_builder.py, concatenating parser extraction, ast extraction and LLM explanation into a single custom object.
 from explainer import clean_cell_output
-def assign_sections(parsed_cells):
-    """
-    Attach section headers (markdown starting with #) to following cells.
-    """
-    current = "Untitled Section"
-    for c in parsed_cells:
-        if c["type"] == "markdown":
-            first_line = c["source"].split('\n')[0].strip()
-            if first_line.startswith('#'):
-                current = first_line.lstrip('# ').strip()
-        c["section"] = current
-    return parsed_cells
-
+from context_packer import field_token_counts
+from parser import assign_sections  # re-exported: the build scripts import it from here
 
 
 def build_final_object(parsed, analyzed, explained):
@@ -24,6 +13,7 @@ def build_final_object(parsed, analyzed, explained):
 
     obj = {
         "cell_id": parsed["id"],
+        "notebook_path": parsed.get("notebook_path"),
         "cell_type": parsed["type"],
         "cell_index": parsed.get("cell_index", -1),
         "exec_order": parsed.get("exec_order", None),
@@ -33,6 +23,7 @@ def build_final_object(parsed, analyzed, explained):
         "has_error": parsed.get("has_error", False),
         "used": analyzed.get("used", []),
         "defined": analyzed.get("defined", []),
+        "external_inputs": analyzed.get("external_inputs", []),
         "called_symbols": analyzed.get("called_symbols", []),
         "purpose": explained.get("purpose", ""),
         "explanation": explained.get("explanation", ""),
@@ -47,4 +38,7 @@ def build_final_object(parsed, analyzed, explained):
 
     obj["dependency_score"] = len(obj["used"]) + len(obj["called_symbols"])
 
+    # Precomputed so the context packer does not re-count every retrieved cell per question
+    obj["token_counts"] = field_token_counts(obj)
+
     return obj
\ No newline at end of file
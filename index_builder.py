@@ -1,4 +1,6 @@
 from langchain_chroma import Chroma
+from rag_text_splitter import chunk_ids
+import tracing
 
 CUSTOM_OBJECT_PATH = "artifacts/final_build_cell.json"
 PERSIST_DIR = "./chroma_store"
@@ -9,7 +11,7 @@ TEXT_COLLECTION = "text_embeddings"
 
 def build_collection(documents, embedding_model, collection_name: str, persist_dir: str = "./chroma_store"):
     """
-    Builds a single Chroma collection.
+    Builds a single Chroma collection from scratch, replacing any existing one of that name.
 
     Args:
         documents: List[Document]
@@ -24,12 +26,18 @@ def build_collection(documents, embedding_model, collection_name: str, persist_d
     if not documents:
         raise ValueError(f"No documents provided for collection '{collection_name}'")
 
-    vectordb = Chroma.from_documents(
-        documents=documents,
-        embedding=embedding_model,
-        persist_directory=persist_dir,
-        collection_name=collection_name
-    )
+    with tracing.span("index_write", collection=collection_name, chunks=len(documents)):
+        # A full build replaces the collection: upserting into the persisted one would keep the
+        # chunks of cells that were deleted or edited since (update_collection handles diffs)
+        Chroma(persist_directory=persist_dir, collection_name=collection_name).delete_collection()
+
+        vectordb = Chroma.from_documents(
+            documents=documents,
+            embedding=embedding_model,
+            ids=chunk_ids(documents),
+            persist_directory=persist_dir,
+            collection_name=collection_name
+        )
 
     print(f"✅ Collection '{collection_name}' built with {len(documents)} documents")
 
@@ -51,3 +59,50 @@ def load_collection(embedding_model, collection_name: str, persist_dir: str = ".
     print(f"📂 Collection '{collection_name}' loaded")
 
     return vectordb
+
+
+def diff_custom_objects(old: dict, new: dict) -> dict:
+    """
+    Compares two custom objects ({cell_id: cell_obj}) and returns the cell_ids that
+    were added, changed or removed in `new`.
+    """
+    added = [cid for cid in new if cid not in old]
+    removed = [cid for cid in old if cid not in new]
+    changed = [cid for cid in new if cid in old and new[cid] != old[cid]]
+
+    return {"added": added, "changed": changed, "removed": removed}
+
+
+def update_collection(documents, embedding_model, collection_name: str, diff: dict,
+                      persist_dir: str = "./chroma_store"):
+    """
+    Incrementally updates an existing Chroma collection.
+    Chunks of changed and removed cells are deleted, then the chunks of added and
+    changed cells are upserted. Unchanged cells are never re-embedded.
+
+    Args:
+        documents: List[Document] of the full split corpus
+        embedding_model: Embedding wrapper (must match the one used during build)
+        collection_name: Name of the collection
+        diff: Output of diff_custom_objects
+        persist_dir: Base directory for Chroma storage
+
+    Returns:
+        Chroma vector DB instance
+    """
+    vectordb = load_collection(embedding_model, collection_name, persist_dir)
+
+    stale_ids = diff["changed"] + diff["removed"]
+    dirty_ids = set(diff["added"]) | set(diff["changed"])
+    new_docs = [d for d in documents if d.metadata.get("cell_id") in dirty_ids]
+
+    with tracing.span("index_write", collection=collection_name, chunks=len(new_docs), stale_cells=len(stale_ids)):
+        if stale_ids:
+            vectordb.delete(where={"cell_id": {"$in": stale_ids}})
+        if new_docs:
+            vectordb.add_documents(new_docs, ids=chunk_ids(new_docs))
+
+    print(f"♻️ Collection '{collection_name}' updated: "
+          f"{len(new_docs)} chunks upserted, {len(stale_ids)} stale cells removed")
+
+    return vectordb
@@ -0,0 +1,103 @@
+# lineage.py: precomputed cross-cell def-use lineage, built at ingest time from the analyzer signals.
+# Lets the retriever pull in the upstream cells of a hit (preprocessing before evaluation, etc.)
+# with plain list lookups instead of extra vector searches.
+import json
+import os
+from typing import Dict, List, Tuple
+
+from analyzer import BUILTINS, IPYTHON_BUILTINS
+
+LINEAGE_PATH = "artifacts/lineage_index.json"
+
+
+def _external_inputs(cell: Dict) -> List[str]:
+    if "external_inputs" in cell:
+        return cell["external_inputs"]
+    # Older custom objects did not store external_inputs; derive it the same way the analyzer does
+    defined = set(cell.get("defined", []))
+    return [v for v in cell.get("used", []) if v not in defined and v not in BUILTINS and v not in IPYTHON_BUILTINS]
+
+
+def build_lineage_index(cells: List[Dict]) -> Dict:
+    """
+    Builds a def-use graph over cells. For every external input of a cell, the edge goes to the
+    latest earlier cell in the same notebook (ordered by cell_index, then exec_order) that defines it.
+
+    Returns a compact adjacency list:
+        {"cell_ids": [...], "upstream": [[position, ...], ...]}
+    where upstream[i] holds the positions (in cell_ids) of the cells that cell_ids[i] depends on.
+    """
+    ordered = sorted(
+        cells,
+        key=lambda c: (c.get("notebook_path") or "", c.get("cell_index", -1), c.get("exec_order") or 0)
+    )
+
+    cell_ids = [c["cell_id"] for c in ordered]
+    upstream = []
+
+    current_notebook = None
+    last_definition = {}  # name -> position of the latest cell defining it
+
+    for position, cell in enumerate(ordered):
+        if cell.get("notebook_path") != current_notebook:
+            current_notebook = cell.get("notebook_path")
+            last_definition = {}
+
+        parents = {last_definition[name] for name in _external_inputs(cell) if name in last_definition}
+        upstream.append(sorted(parents))
+
+        for name in cell.get("defined", []):
+            last_definition[name] = position
+
+    return {"cell_ids": cell_ids, "upstream": upstream}
+
+
+def save_lineage_index(index: Dict, path: str = LINEAGE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        # No indent: this file is read on every retriever start-up
+        json.dump(index, f, separators=(",", ":"))
+
+
+class LineageIndex:
+    """Read side of the lineage adjacency lists."""
+
+    def __init__(self, index: Dict):
+        self.cell_ids = index["cell_ids"]
+        self.upstream_positions = index["upstream"]
+        self.position = {cell_id: i for i, cell_id in enumerate(self.cell_ids)}
+
+    @classmethod
+    def load(cls, path: str = LINEAGE_PATH) -> "LineageIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def upstream(self, cell_id: str, depth: int = 1) -> List[str]:
+        """
+        Cells the given cell depends on, up to `depth` hops back: direct parents first, then their
+        parents, and within each hop the cells closest above the given cell first.
+        """
+        return [upstream_id for upstream_id, _, _ in self.upstream_ranked(cell_id, depth)]
+
+    def upstream_ranked(self, cell_id: str, depth: int = 1) -> List[Tuple[str, int, int]]:
+        """upstream() as (cell_id, hops, distance in cells above the given cell) tuples, in the same order."""
+        if cell_id not in self.position:
+            return []
+
+        start = self.position[cell_id]
+        seen = {start}
+        result = []
+        level = [start]
+
+        for hops in range(1, depth + 1):
+            parents = {
+                parent for position in level for parent in self.upstream_positions[position]
+                if parent not in seen
+            }
+            if not parents:
+                break
+            seen.update(parents)
+            level = sorted(parents, key=lambda p: start - p)
+            result.extend((self.cell_ids[p], hops, start - p) for p in level)
+
+        return result
@@ -0,0 +1,351 @@
+# llm_backends.py: one place that builds the chat models. Each role ("explain" for the ingest explainer,
+# "answer" for the chatbot) maps to a registered backend (ollama, groq, stub). Models are built once per
+# process and share pooled keep-alive HTTP clients (one pool per backend, per host for ollama); transient
+# errors (dropped connections, timeouts, 429 / 5xx) are retried a bounded number of times with jittered
+# exponential backoff. The models are LangChain Runnables, so `prompt | get_llm("answer")` works.
+#
+#   NBRAG_EXPLAIN_BACKEND=ollama   NBRAG_EXPLAIN_MODEL=llama3:8b
+#   NBRAG_ANSWER_BACKEND=groq      NBRAG_ANSWER_MODEL=llama-3.3-70b-versatile
+#   NBRAG_LLM_TIMEOUT=120  NBRAG_LLM_RETRIES=3  NBRAG_LLM_MAX_CONNECTIONS=16
+#
+# The "stub" backend answers deterministically without any server, for load tests of the full ingest
+# and query path (NBRAG_EXPLAIN_BACKEND=stub NBRAG_ANSWER_BACKEND=stub, NBRAG_STUB_LATENCY=0.5 to
+# mimic a real model's response time).
+import asyncio
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+import groq
+import httpx
+from dotenv import load_dotenv
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from context_packer import count_tokens
+import tracing
+
+load_dotenv()
+
+ROLES: Dict[str, Dict] = {
+    "explain": {"backend": "ollama", "model": "llama3:8b", "temperature": 0, "max_tokens": None},
+    "answer": {"backend": "groq", "model": "llama-3.3-70b-versatile", "temperature": 0.1, "max_tokens": 2048},
+}
+
+TIMEOUT = float(os.environ.get("NBRAG_LLM_TIMEOUT", 120))
+RETRIES = int(os.environ.get("NBRAG_LLM_RETRIES", 3))
+MAX_CONNECTIONS = int(os.environ.get("NBRAG_LLM_MAX_CONNECTIONS", 16))
+STUB_LATENCY = float(os.environ.get("NBRAG_STUB_LATENCY", 0))
+
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 8.0
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+_BACKENDS: Dict[str, Callable[[Dict], BaseChatModel]] = {}
+_models: Dict[tuple, "RetryingLLM"] = {}
+_pools: Dict[str, tuple] = {}
+_lock = threading.Lock()
+
+
+def register_backend(name: str):
+    """Decorator: registers factory(settings) -> chat model under `name` (settings: model, temperature, ...)."""
+    def decorator(factory):
+        _BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+def backends() -> List[str]:
+    return sorted(_BACKENDS)
+
+
+# --------------------------------------------------
+# Pooled HTTP clients
+# --------------------------------------------------
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS,
+                        keepalive_expiry=30.0)
+
+
+def http_clients(backend: str) -> tuple:
+    """The (sync, async) keep-alive httpx clients shared by every model of one backend."""
+    with _lock:
+        if backend not in _pools:
+            _pools[backend] = (httpx.Client(limits=_limits(), timeout=TIMEOUT),
+                               httpx.AsyncClient(limits=_limits(), timeout=TIMEOUT))
+        return _pools[backend]
+
+
+def ollama_clients(host: str | None) -> tuple:
+    """
+    The (sync, async) ollama clients shared by every ollama model of one host. ChatOllama only takes
+    client settings and builds its own clients, so _ollama swaps these in after construction.
+    """
+    from ollama import AsyncClient, Client
+
+    key = f"ollama:{host or ''}"
+    with _lock:
+        if key not in _pools:
+            _pools[key] = (Client(host=host, timeout=TIMEOUT, limits=_limits()),
+                           AsyncClient(host=host, timeout=TIMEOUT, limits=_limits()))
+        return _pools[key]
+
+
+# --------------------------------------------------
+# Backends
+# --------------------------------------------------
+@register_backend("ollama")
+def _ollama(settings: Dict) -> BaseChatModel:
+    from langchain_ollama import ChatOllama
+
+    llm = ChatOllama(
+        model=settings["model"],
+        temperature=settings["temperature"],
+        num_predict=settings["max_tokens"]
+    )
+    llm._client, llm._async_client = ollama_clients(llm.base_url)
+    return llm
+
+
+@register_backend("groq")
+def _groq(settings: Dict) -> BaseChatModel:
+    from langchain_groq import ChatGroq
+
+    sync_client, async_client = http_clients("groq")
+    return ChatGroq(
+        model=settings["model"],
+        temperature=settings["temperature"],
+        max_tokens=settings["max_tokens"],
+        timeout=TIMEOUT,
+        max_retries=0,  # retried by RetryingLLM, so the policy is the same for every backend
+        http_client=sync_client,
+        http_async_client=async_client
+    )
+
+
+@register_backend("stub")
+def _stub(settings: Dict) -> BaseChatModel:
+    # Own model name, so stub explanations never share explanation-cache entries with real ones
+    return StubChatModel(model=f"stub:{settings['model']}", latency=STUB_LATENCY)
+
+
+# --------------------------------------------------
+# Offline stub
+# --------------------------------------------------
+_INTENTS = ["data_loading", "preprocessing", "feature_engineering", "model_training", "evaluation",
+            "visualization", "utility"]
+_CELL_IDS = re.compile(r"FULL CONTEXT FOR CELL (\S+) ---")
+_CODE = re.compile(r"```python\s*(.*?)```", re.DOTALL)
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Deterministic local chat model: the reply depends only on the prompt. Explainer prompts get a
+    WHAT/WHY/RESULT/TAG reply the explainer parses; other prompts get an answer naming the context cells.
+    """
+    model: str = "stub"
+    latency: float = 0.0  # seconds before the reply (time to first token when streaming)
+
+    @property
+    def _llm_type(self) -> str:
+        return "nbrag-stub"
+
+    @staticmethod
+    def _reply(messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+
+        if "WHAT:" in prompt and "TAG:" in prompt:
+            code = _CODE.search(str(messages[-1].content))
+            first_line = next((line.strip() for line in (code.group(1) if code else "").splitlines()
+                               if line.strip()), "no code")
+            return (
+                f"WHAT:\nStub explanation {digest[:8]}: the cell runs `{first_line[:80]}`.\n\n"
+                f"WHY:\nPlaceholder reasoning for load testing ({digest[8:16]}).\n\n"
+                f"RESULT:\nNo significant output.\n\n"
+                f"TAG: {_INTENTS[int(digest, 16) % len(_INTENTS)]}"
+            )
+
+        cells = list(dict.fromkeys(_CELL_IDS.findall(prompt)))
+        if cells:
+            return f"Stub answer {digest[:8]}, based on cells {', '.join(cells)}."
+        return f"Stub answer {digest[:8]}."
+
+    def _message(self, messages: List[BaseMessage]) -> AIMessage:
+        text = self._reply(messages)
+        input_tokens = sum(count_tokens(str(message.content)) for message in messages)
+        output_tokens = count_tokens(text)
+        return AIMessage(content=text, usage_metadata={
+            "input_tokens": input_tokens, "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        })
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        message = self._message(messages)
+        for word in re.findall(r"\S+\s*", message.content):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=message.usage_metadata))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        message = self._message(messages)
+        for word in re.findall(r"\S+\s*", message.content):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=message.usage_metadata))
+
+
+# --------------------------------------------------
+# Retries
+# --------------------------------------------------
+def is_transient(error: BaseException) -> bool:
+    """Errors worth retrying: network failures, timeouts, rate limits and server-side 5xx."""
+    if isinstance(error, (httpx.TransportError, groq.APIConnectionError, ConnectionError, TimeoutError,
+                          asyncio.TimeoutError)):
+        return True
+    return getattr(error, "status_code", None) in RETRY_STATUSES
+
+
+def _backoff(attempt: int) -> float:
+    """Full jitter: a random wait up to the exponential cap, so parallel callers do not retry in step."""
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** attempt))
+
+
+class RetryingLLM(Runnable[LanguageModelInput, BaseMessage]):
+    """
+    Wraps a chat model with bounded retries on transient errors. A Runnable with invoke / ainvoke /
+    stream / astream like the model itself (anything else is delegated), plus `backend` and `model` names.
+    A stream is only retried until its first chunk arrives.
+    """
+
+    def __init__(self, llm: BaseChatModel, role: str, backend: str, model: str, retries: int = RETRIES):
+        self.llm = llm
+        self.role = role
+        self.backend = backend
+        self.model = model
+        self.retries = retries
+
+    def __getattr__(self, name):
+        if name == "llm":  # not set yet (copy / unpickling)
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        if attempt >= self.retries or not is_transient(error):
+            return False
+        print(f"⚠️ {self.backend} call failed ({type(error).__name__}), retry {attempt + 1}/{self.retries}")
+        tracing.count("llm_retries", stage=self.role, model=self.model, error=type(error).__name__)
+        return True
+
+    def invoke(self, input: LanguageModelInput, config: RunnableConfig | None = None, **kwargs: Any) -> BaseMessage:
+        for attempt in range(self.retries + 1):
+            try:
+                return self.llm.invoke(input, config, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            time.sleep(_backoff(attempt))
+
+    async def ainvoke(self, input: LanguageModelInput, config: RunnableConfig | None = None,
+                      attempt_timeout: float | None = None, **kwargs: Any) -> BaseMessage:
+        """attempt_timeout bounds each attempt on its own; a timed-out attempt is retried like other transient errors."""
+        for attempt in range(self.retries + 1):
+            try:
+                return await asyncio.wait_for(self.llm.ainvoke(input, config, **kwargs), timeout=attempt_timeout)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            await asyncio.sleep(_backoff(attempt))
+
+    def stream(self, input: LanguageModelInput, config: RunnableConfig | None = None, **kwargs: Any):
+        for attempt in range(self.retries + 1):
+            started = False
+            try:
+                for chunk in self.llm.stream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not self._should_retry(e, attempt):
+                    raise
+            time.sleep(_backoff(attempt))
+
+    async def astream(self, input: LanguageModelInput, config: RunnableConfig | None = None, **kwargs: Any):
+        for attempt in range(self.retries + 1):
+            started = False
+            try:
+                async for chunk in self.llm.astream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not self._should_retry(e, attempt):
+                    raise
+            await asyncio.sleep(_backoff(attempt))
+
+
+# --------------------------------------------------
+# Registry
+# --------------------------------------------------
+def role_settings(role: str, **overrides) -> Dict:
+    """
+    The role's defaults with the NBRAG_<ROLE>_BACKEND / NBRAG_<ROLE>_MODEL overrides applied, then
+    `overrides` (temperature, max_tokens) from the caller.
+    """
+    if role not in ROLES:
+        raise ValueError(f"Unknown LLM role '{role}', expected one of {sorted(ROLES)}")
+    unknown = set(overrides) - {"temperature", "max_tokens"}
+    if unknown:
+        raise ValueError(f"Unsupported LLM setting(s) {sorted(unknown)}, expected temperature or max_tokens")
+    settings = dict(ROLES[role])
+    settings["backend"] = os.environ.get(f"NBRAG_{role.upper()}_BACKEND", settings["backend"])
+    settings["model"] = os.environ.get(f"NBRAG_{role.upper()}_MODEL", settings["model"])
+    settings.update(overrides)
+    return settings
+
+
+def get_llm(role: str, **overrides) -> RetryingLLM:
+    """
+    The shared chat model for `role`, built on first use. overrides (e.g. max_tokens=None) change the
+    role's temperature / max_tokens and get their own shared model.
+    """
+    key = (role, tuple(sorted(overrides.items())))
+    with _lock:
+        if key in _models:
+            return _models[key]
+
+    settings = role_settings(role, **overrides)
+    backend = settings["backend"]
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{backend}', expected one of {backends()}")
+    llm = _BACKENDS[backend](settings)
+    wrapped = RetryingLLM(llm, role, backend, getattr(llm, "model", settings["model"]))
+
+    with _lock:
+        # Another thread may have built it meanwhile; keep the first one
+        return _models.setdefault(key, wrapped)
+
+
+def describe() -> Dict[str, Dict]:
+    """Backend and model per role that has been built, for /health."""
+    with _lock:
+        return {llm.role: {"backend": llm.backend, "model": llm.model} for llm in _models.values()}
@@ -0,0 +1,207 @@
+# numpy_store.py: in-process flat vector index, an alternative backend to Chroma for RelationalRetriever.
+# Embeddings live in one contiguous float32 memory-mapped matrix, metadata in parallel arrays.
+# Top-k is a single matrix-vector product plus argpartition, with boolean masks for metadata filters.
+import json
+import os
+from typing import Dict, List
+
+import numpy as np
+
+NUMPY_STORE_DIR = "numpy_text_rag"
+
+_VECTORS_FILE = "vectors.f32"
+_META_FILE = "meta.json"
+
+# Chroma's get() binds one SQL variable per row, so large collections are exported in pages
+_EXPORT_PAGE = 5000
+
+
+def _category(value) -> tuple:
+    """Dictionary-encoding key: True == 1 and False == 0 in Python, but not in Chroma's metadata filters."""
+    return isinstance(value, bool), value
+
+
+class NumpyVectorStore:
+    """
+    Exposes the subset of the chromadb Collection API the retriever uses: count(), get() and
+    query(query_embeddings, n_results, where, include), with the same result layout.
+    Scores are cosine distances (1 - cosine similarity).
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, _META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        self.path = path
+        self.ids = meta["ids"]
+        self.documents = meta["documents"]
+        self.metadata_keys = meta["metadata_keys"]
+
+        n, dim = meta["shape"]
+        self.vectors = np.memmap(os.path.join(path, _VECTORS_FILE), dtype=np.float32, mode="r", shape=(n, dim)) \
+            if n else np.zeros((0, dim), dtype=np.float32)
+
+        # One dictionary-encoded int32 array per metadata field, so filters become vectorized comparisons
+        self.columns = {}
+        for key, values in meta["columns"].items():
+            keys = list(dict.fromkeys(_category(v) for v in values))
+            lookup = {category: code for code, category in enumerate(keys)}
+            codes = np.fromiter((lookup[_category(v)] for v in values), dtype=np.int32, count=len(values))
+            self.columns[key] = (codes, [value for _, value in keys], lookup)
+        self._numeric = {}
+
+    # --------------------------------------------------
+    # Build
+    # --------------------------------------------------
+    @staticmethod
+    def write(path: str, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict]):
+        """Writes a store; rows are L2-normalized so the dot product is the cosine similarity."""
+        os.makedirs(path, exist_ok=True)
+
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(ids), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+
+        vectors = np.memmap(os.path.join(path, _VECTORS_FILE), dtype=np.float32, mode="w+", shape=matrix.shape) \
+            if len(ids) else None
+        if vectors is not None:
+            vectors[:] = matrix
+            vectors.flush()
+
+        keys = sorted({key for m in metadatas for key in (m or {})})
+        columns = {key: [(m or {}).get(key) for m in metadatas] for key in keys}
+
+        with open(os.path.join(path, _META_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "shape": list(matrix.shape) if len(ids) else [0, 0],
+                "ids": ids,
+                "documents": documents,
+                "metadata_keys": keys,
+                "columns": columns,
+            }, f, separators=(",", ":"))
+
+        print(f"✅ NumPy store written to {path} ({len(ids)} vectors)")
+
+    @classmethod
+    def from_chroma(cls, collection, path: str) -> "NumpyVectorStore":
+        """Exports an existing Chroma collection without re-embedding anything."""
+        ids, embeddings, documents, metadatas = [], [], [], []
+        for offset in range(0, collection.count(), _EXPORT_PAGE):
+            page = collection.get(include=["embeddings", "documents", "metadatas"],
+                                  limit=_EXPORT_PAGE, offset=offset)
+            ids.extend(page["ids"])
+            embeddings.extend(page["embeddings"])
+            documents.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+
+        cls.write(path, ids, embeddings, documents, metadatas)
+        return cls(path)
+
+    # --------------------------------------------------
+    # Read
+    # --------------------------------------------------
+    def count(self) -> int:
+        return len(self.ids)
+
+    def get(self, include=("documents", "metadatas")) -> Dict:
+        return {
+            "ids": list(self.ids),
+            "documents": list(self.documents) if "documents" in include else None,
+            "metadatas": [self._metadata(i) for i in range(len(self.ids))] if "metadatas" in include else None,
+        }
+
+    def _metadata(self, row: int) -> Dict:
+        metadata = {}
+        for key in self.metadata_keys:
+            codes, categories, _ = self.columns[key]
+            value = categories[codes[row]]
+            if value is not None:
+                metadata[key] = value
+        return metadata
+
+    def _codes_for(self, key: str, values) -> tuple:
+        codes, _, lookup = self.columns.get(key, (np.full(len(self.ids), -1, dtype=np.int32), [], {}))
+        wanted = [lookup[_category(v)] for v in values if _category(v) in lookup]
+        return codes, np.array(wanted, dtype=np.int32)
+
+    def _numeric_column(self, key: str) -> np.ndarray:
+        if key not in self._numeric:
+            codes, categories, _ = self.columns[key]
+            values = np.array([
+                float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+                for v in categories
+            ])
+            self._numeric[key] = values[codes]
+        return self._numeric[key]
+
+    def _mask(self, where: Dict) -> np.ndarray:
+        """Translates a Chroma-style where clause into a boolean row mask."""
+        n = len(self.ids)
+        mask = np.ones(n, dtype=bool)
+
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._mask(clause)
+                continue
+            if key == "$or":
+                either = np.zeros(n, dtype=bool)
+                for clause in condition:
+                    either |= self._mask(clause)
+                mask &= either
+                continue
+
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+
+            for op, value in condition.items():
+                if op in ("$eq", "$ne", "$in", "$nin"):
+                    codes, wanted = self._codes_for(key, [value] if op in ("$eq", "$ne") else value)
+                    hit = np.isin(codes, wanted)
+                    mask &= hit if op in ("$eq", "$in") else ~hit
+                elif op in ("$gt", "$gte", "$lt", "$lte"):
+                    if key not in self.columns:
+                        mask &= False
+                        continue
+                    compare = {"$gt": np.greater, "$gte": np.greater_equal,
+                               "$lt": np.less, "$lte": np.less_equal}[op]
+                    # NaN (missing / non-numeric) compares False, like a missing key in Chroma
+                    mask &= compare(self._numeric_column(key), value)
+                else:
+                    raise ValueError(f"Unsupported where operator: {op}")
+
+        return mask
+
+    def query(self, query_embeddings, n_results: int = 10, where: Dict | None = None,
+              include=("metadatas", "documents", "distances")) -> Dict:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        candidates = np.flatnonzero(self._mask(where)) if where else np.arange(len(self.ids))
+        k = min(n_results, len(candidates))
+
+        result = {"ids": [], "metadatas": [], "documents": [], "distances": []}
+        if k == 0:
+            for _ in range(len(queries)):
+                for field in result:
+                    result[field].append([])
+            return result
+
+        # (n_queries, n_candidates) similarities in one matmul
+        matrix = self.vectors if where is None else self.vectors[candidates]
+        similarities = queries @ matrix.T
+
+        for row in similarities:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            rows = candidates[top]
+
+            result["ids"].append([self.ids[r] for r in rows])
+            result["distances"].append([float(1 - row[t]) for t in top])
+            result["metadatas"].append([self._metadata(r) for r in rows] if "metadatas" in include else None)
+            result["documents"].append([self.documents[r] for r in rows] if "documents" in include else None)
+
+        return result
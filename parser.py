@@ -1,41 +1,153 @@
 # 1: parser.py, here basic metadata is extracted using nbformat like cell nuber, execution count etc
+import os
 import nbformat
-from typing import List, Dict
+from typing import List, Dict, Iterator
+
+import tracing
+
+# MIME bundles that only carry binary (base64) payloads. clean_cell_output never reads them,
+# so the streaming parser drops or size-caps them while reading.
+BINARY_MIME_PREFIXES = ("image/", "audio/", "video/", "application/pdf", "application/octet-stream")
+
+_CELL_PREFIX = "cells.item"
+_DATA_PREFIX = "cells.item.outputs.item.data."
+
 
 def load_notebook(path: str):
     return nbformat.read(path, as_version=4)
 
-def parse_notebook(path: str) -> List[Dict]:
+
+def _parse_cell(cell, idx: int, path: str) -> Dict:
+    cell_type = cell.get("cell_type", "unknown")
+    source = cell.get("source", "")
+    source = "".join(source) if isinstance(source, list) else str(source)
+    output = cell.get("outputs", [])
+    metadata = dict(cell.get("metadata", {}))
+
+    exec_count = cell.get("execution_count")
+    exec_order = exec_count
+
+    # FIXED: Consistent field names + new useful fields
+    return {
+        "id": cell.get("id", f"cell-{idx}"),
+        "cell_index": idx,  # Renamed for consistency
+        "type": cell_type,
+        "exec_order": exec_order,
+        "source": source.strip(),
+        "outputs": output,
+        "metadata": metadata,
+        "has_error": any(o.get("output_type") == "error" for o in output),  # NEW
+        "tags": metadata.get("tags", []),  # NEW: extract tags
+        "notebook_path": path,
+    }
+
+
+@tracing.traced("parse")
+def parse_notebook(path: str, streaming: bool = False) -> List[Dict]:
+    if tracing.is_enabled():
+        tracing.count("bytes_read", os.path.getsize(path), kind="notebook")
+
+    if streaming:
+        try:
+            return list(iter_notebook_cells(path))
+        except ValueError:
+            # nbformat < 4 has no top-level "cells" list; let nbformat upgrade it
+            pass
+
     nb = load_notebook(path)
     parsed_cells = []
 
     for idx, cell in enumerate(nb.cells):
-        cell_type = cell.get("cell_type", "unknown")
-        source = cell.get("source", "")
-        source = "".join(source) if isinstance(source, list) else str(source)
-        output = cell.get("outputs", [])
-        metadata = dict(cell.get("metadata", {}))
-
-        exec_count = cell.get("execution_count")
-        exec_order = exec_count
-
-        # FIXED: Consistent field names + new useful fields
-        parsed_cells.append({
-            "id": cell.get("id", f"cell-{idx}"),
-            "cell_index": idx,  # Renamed for consistency
-            "type": cell_type,
-            "exec_order": exec_order,
-            "source": source.strip(),
-            "outputs": output,
-            "metadata": metadata,
-            "has_error": any(o.get("output_type") == "error" for o in output),  # NEW
-            "tags": metadata.get("tags", []),  # NEW: extract tags
-
-
-        })
+        parsed_cells.append(_parse_cell(cell, idx, path))
 
     return parsed_cells
 
 
+# --------------------------------------------------
+# Streaming parser
+# --------------------------------------------------
+def _is_binary_payload(prefix: str) -> bool:
+    return prefix.startswith(_DATA_PREFIX) and prefix[len(_DATA_PREFIX):].startswith(BINARY_MIME_PREFIXES)
+
+
+def _join_multiline(value):
+    # On disk, nbformat stores long strings as lists of lines; nbformat.read joins them back
+    return "".join(value) if isinstance(value, list) and all(isinstance(v, str) for v in value) else value
+
+
+def _rejoin_cell(cell: Dict) -> Dict:
+    cell["source"] = _join_multiline(cell.get("source", ""))
+    for out in cell.get("outputs", []):
+        if "text" in out:
+            out["text"] = _join_multiline(out["text"])
+        data = out.get("data", {})
+        for mime, value in data.items():
+            data[mime] = _join_multiline(value)
+    return cell
 
 
+def iter_notebook_cells(path: str, max_binary_bytes: int = 0) -> Iterator[Dict]:
+    """
+    Streams a notebook from disk and yields parsed cells one at a time, in the same shape
+    as parse_notebook. Only one cell is held in memory at a time.
+
+    Binary MIME payloads (images, audio, video, PDFs) are replaced by a short placeholder
+    while reading, unless they are at most max_binary_bytes long. Peak memory is bounded by
+    the largest single cell/payload rather than the notebook size.
+
+    Requires nbformat 4 on disk; raises ValueError for older formats.
+    """
+    import ijson
+
+    idx = 0
+    builder = None
+    major_version = None
+
+    with open(path, "rb") as f:
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            if builder is None:
+                if prefix == _CELL_PREFIX and event == "start_map":
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                elif prefix == "nbformat" and event == "number":
+                    major_version = int(value)
+                continue
+
+            if event == "string" and _is_binary_payload(prefix):
+                if not max_binary_bytes or len(value) > max_binary_bytes:
+                    value = f"<binary payload dropped: {len(value)} bytes>"
+
+            builder.event(event, value)
+
+            if prefix == _CELL_PREFIX and event == "end_map":
+                yield _parse_cell(_rejoin_cell(builder.value), idx, path)
+                idx += 1
+                builder = None
+
+    if major_version is not None and major_version < 4:
+        raise ValueError(f"Streaming parser needs nbformat 4, got nbformat {major_version}: {path}")
+
+
+def namespace_cell_ids(parsed_cells: List[Dict], notebook_path: str) -> List[Dict]:
+    """
+    nbformat cell ids are only unique inside one notebook. For a multi-notebook corpus,
+    prefix every id with the notebook path so it stays unique across files.
+    """
+    for cell in parsed_cells:
+        cell["notebook_path"] = notebook_path
+        cell["id"] = f"{notebook_path}::{cell['id']}"
+    return parsed_cells
+
+
+def assign_sections(parsed_cells):
+    """
+    Attach section headers (markdown starting with #) to following cells.
+    """
+    current = "Untitled Section"
+    for c in parsed_cells:
+        if c["type"] == "markdown":
+            first_line = c["source"].split('\n')[0].strip()
+            if first_line.startswith('#'):
+                current = first_line.lstrip('# ').strip()
+        c["section"] = current
+    return parsed_cells
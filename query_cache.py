@@ -0,0 +1,124 @@
+# query_cache.py: in-memory caches on the query path, so repeated questions skip the embedding model
+# and near-identical questions skip the answer LLM.
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation do not change what a question means."""
+    return re.sub(r"\s+", " ", query).strip().rstrip("?.! ").lower()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU of normalized query text -> embedding, with an optional TTL in seconds.
+    Thread-safe, so one retriever can serve several sessions.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (timestamp, embedding)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query: str) -> List[float] | None:
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or time.monotonic() - entry[0] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, query: str, embedding: List[float]):
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed by query embedding. A new question reuses a cached answer when its embedding has
+    cosine similarity >= threshold with a cached question's embedding and the index fingerprint is
+    unchanged. Entries from an older index are dropped on lookup.
+    """
+
+    def __init__(self, threshold: float = 0.95, maxsize: int = 256):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self._vectors = []  # unit-normalized np.float32 arrays
+        self._answers = []
+        self._fingerprints = []
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(embedding: List[float]):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding: List[float], fingerprint: str) -> str | None:
+        with self._lock:
+            # A rebuilt index invalidates everything cached against the old one
+            if any(fp != fingerprint for fp in self._fingerprints):
+                keep = [i for i, fp in enumerate(self._fingerprints) if fp == fingerprint]
+                self._vectors = [self._vectors[i] for i in keep]
+                self._answers = [self._answers[i] for i in keep]
+                self._fingerprints = [self._fingerprints[i] for i in keep]
+
+            if self._vectors:
+                similarities = np.stack(self._vectors) @ self._unit(embedding)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    return self._answers[best]
+
+            self.misses += 1
+            return None
+
+    def store(self, embedding: List[float], answer: str, fingerprint: str):
+        with self._lock:
+            self._vectors.append(self._unit(embedding))
+            self._answers.append(answer)
+            self._fingerprints.append(fingerprint)
+
+            # Oldest entries go first
+            if len(self._vectors) > self.maxsize:
+                del self._vectors[0], self._answers[0], self._fingerprints[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._answers),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,72 @@
+# query_client.py: thin client for query_server.py. Standard library only, so it starts instantly
+# and can be imported from scripts and notebooks without LangChain, Chroma or torch.
+#
+# Usage: python query_client.py "What was the accuracy?"   (one question)
+#        python query_client.py                            (interactive loop)
+#        python query_client.py --health | --stats
+import json
+import os
+import sys
+import urllib.error
+import urllib.request
+
+SERVER_URL = os.environ.get("NBRAG_SERVER", "http://127.0.0.1:8765")
+
+
+def _request(path: str, payload: dict | None = None, url: str = SERVER_URL, timeout: float = 300.0) -> dict:
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(
+        url.rstrip("/") + path,
+        data=data,
+        headers={"Content-Type": "application/json"},
+        method="POST" if data is not None else "GET",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        # The server answers errors with {"error": ...}
+        detail = json.loads(e.read() or b"{}").get("error", e.reason)
+        raise RuntimeError(f"Server error {e.code}: {detail}") from None
+
+
+def ask(question: str, session: str = "default", filters: dict | None = None, url: str = SERVER_URL) -> str:
+    payload = {"question": question, "session": session}
+    if filters:
+        payload["filters"] = filters
+    return _request("/ask", payload, url)["answer"]
+
+
+def clear(session: str = "default", url: str = SERVER_URL) -> dict:
+    return _request("/clear", {"session": session}, url)
+
+
+def health(url: str = SERVER_URL) -> dict:
+    return _request("/health", url=url, timeout=5.0)
+
+
+def stats(url: str = SERVER_URL) -> dict:
+    return _request("/stats", url=url, timeout=5.0)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        if args and args[0] in ("--health", "--stats"):
+            print(json.dumps(health() if args[0] == "--health" else stats(), indent=2))
+        elif args:
+            print(ask(" ".join(args)))
+        else:
+            print("✅ Connected to", SERVER_URL, "(Type 'exit' to stop, 'clear' to reset the conversation)")
+            while True:
+                query = input("\n🧑‍💻 You: ")
+                if query.lower() in ("exit", "quit"):
+                    print("Goodbye! 👋")
+                    break
+                if query.lower() == "clear":
+                    clear()
+                    continue
+                if query.strip():
+                    print(f"\n🤖 Assistant:\n{ask(query)}")
+    except urllib.error.URLError as e:
+        sys.exit(f"❌ Could not reach the query server at {SERVER_URL} ({e.reason}). Start it with: python query_server.py")
@@ -1,28 +1,54 @@
 # : the chatbot with rag, which includes the chatbot class.
+import asyncio
 import os
+import re
+import time
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
 from retrieval import RelationalRetriever
+from query_cache import SemanticAnswerCache
+from query_filters import route_query
+from conversation_memory import ConversationMemory
+from llm_backends import get_llm
+import tracing
 
 load_dotenv()
 
+# Words that usually point back into the conversation ("why did it fail?", "show me that code")
+FOLLOW_UP_WORDS = {
+    "it", "its", "that", "this", "these", "those", "they", "them", "their", "he", "she",
+    "above", "previous", "earlier", "same", "again", "also", "instead", "else", "more",
+}
+
 
 class NotebookChatbot:
-    def __init__(self):
+    def __init__(self, answer_cache_threshold: float | None = 0.95, retriever: RelationalRetriever | None = None,
+                 llm=None, answer_cache: SemanticAnswerCache | None = None):
         """
         The Setup.
         1. Instantiate your RelationalRetriever here (Composition).
-        2. Initialize your ChatGroq LLM instance.
-        3. Create an empty list for self.chat_history to manage state.
+        2. Take the shared "answer" LLM from the backend registry (Groq unless NBRAG_ANSWER_BACKEND is set).
+        3. Create the conversation memory (recent turns verbatim, older ones summarized) to manage state.
+        4. Create the semantic answer cache (None disables it).
+        Passing retriever / llm / answer_cache shares them between chatbots (one per session in query_server.py).
         """
         print("🤖 Booting up Data Science Assistant (Llama 3 70B)...")
-        self.retriever = RelationalRetriever()
-        self.llm = ChatGroq(
-            model="llama-3.3-70b-versatile",
-            temperature=0.1,
-            max_tokens=2048
-        )
-        self.chat_history = []
+        self.retriever = retriever or RelationalRetriever()
+        self.llm = llm or get_llm("answer")
+        self.memory = ConversationMemory(llm=self.llm)
+
+        # How many def-use hops of upstream cells to add to each retrieval (0 disables it)
+        self.upstream_depth = 1
+
+        # Derive a metadata filter from the question's wording when ask() gets none (see query_filters)
+        self.route_queries = True
+
+        if answer_cache is not None:
+            self.answer_cache = answer_cache
+        else:
+            self.answer_cache = (
+                SemanticAnswerCache(threshold=answer_cache_threshold)
+                if answer_cache_threshold is not None else None
+            )
 
     def _build_system_prompt(self) -> str:
         """
@@ -49,29 +75,35 @@ class NotebookChatbot:
             5. Be concise, professional, and directly answer the question.
             """
 
+    @property
+    def chat_history(self):
+        """Read-only (role, message) view of the bounded history kept by self.memory."""
+        return self.memory.chat_history
+
     def _format_memory(self) -> str:
         """
                 The Memory Manager (Private Helper).
-                Loops through self.chat_history and formats it into a readable string
-                (e.g., "User: ... \n Assistant: ...") so the LLM remembers the last few questions.
+                Formats the conversation into a readable string ("User: ... \n Assistant: ...") so the LLM
+                remembers the last few questions: recent turns verbatim, older ones as a rolling summary,
+                under the memory's token cap.
                 """
-        if not self.chat_history:
-            return "No previous conversation."
-
-        memory_str = "--- PREVIOUS CONVERSATION HISTORY ---\n"
-
-        # Grab only the last 3 pairs to save context space
-        recent_history = self.chat_history[-5:]
-
-        for role, message in recent_history:
-            memory_str += f"{role}: {message}\n\n"
+        return self.memory.render()
 
-        return memory_str.strip()
+    def _is_self_contained(self, user_query: str) -> bool:
+        """
+        The answer cache is only safe when the history cannot change what the question means:
+        either there is no history yet, or the question has no follow-up words pointing back into it.
+        """
+        if not self.chat_history:
+            return True
+        words = set(re.findall(r"[a-z']+", user_query.lower()))
+        return not (words & FOLLOW_UP_WORDS)
 
-    def ask(self, user_query: str) -> str:
+    def ask(self, user_query: str, filters: dict | None = None) -> str:
         """
         The Main Orchestrator (Public Method).
-        This is the only function the user actually calls.
+        This is the only function the user actually calls (aask / astream are its async, streaming versions).
+        filters: optional metadata filter for retrieval, e.g. {"intent": "evaluation"}.
 
         Execution Flow to code here:
         1. Call self.retriever.retrieve(user_query)
@@ -80,25 +112,101 @@ class NotebookChatbot:
         4. Grab the system prompt and the formatted memory.
         5. Combine everything into one massive HumanMessage/Prompt.
         6. Invoke self.llm.
-        7. Append the user_query and the LLM's answer to self.chat_history.
+        7. Add the user_query and the LLM's answer to self.memory.
         8. Return the LLM's text response.
         """
+        turn = self._prepare_turn(user_query, filters)
+        if turn["answer"] is not None:
+            return self._finish_turn(user_query, turn)
+
+        # 5. Invoke Llama 3 70B via Groq
+        print("\n🧠 Llama 3 is analyzing your notebook...")
+        start = time.perf_counter()
+        with tracing.span("llm_call", stage="answer"):
+            response = self.llm.invoke(turn["messages"])
+        tracing.observe("llm_call_seconds", time.perf_counter() - start, stage="answer")
+        tracing.record_llm_usage(response, "answer")
+
+        turn["answer"] = response.content
+        return self._finish_turn(user_query, turn)
+
+    async def astream(self, user_query: str, filters: dict | None = None):
+        """
+        Async, streaming version of ask(): yields the answer text piece by piece as Groq produces it.
+        Retrieval and prompt assembly run in a worker thread, so one event loop can serve many
+        sessions (one NotebookChatbot each) at once. The turn is saved to the history when the stream ends.
+        """
+        turn = await asyncio.to_thread(self._prepare_turn, user_query, filters)
+
+        if turn["answer"] is None:
+            pieces = []
+            start = time.perf_counter()
+            async for chunk in self.llm.astream(turn["messages"]):
+                if getattr(chunk, "usage_metadata", None):
+                    tracing.record_llm_usage(chunk, "answer")
+                if chunk.content:
+                    if not pieces:
+                        tracing.observe("llm_first_token_seconds", time.perf_counter() - start, stage="answer")
+                    pieces.append(chunk.content)
+                    yield chunk.content
+            tracing.observe("llm_call_seconds", time.perf_counter() - start, stage="answer")
+            turn["answer"] = "".join(pieces)
+        else:
+            yield turn["answer"]
+
+        self._finish_turn(user_query, turn)
+
+    async def aask(self, user_query: str, filters: dict | None = None) -> str:
+        """Async version of ask(): same result, without blocking the event loop."""
+        pieces = [piece async for piece in self.astream(user_query, filters)]
+        return "".join(pieces)
+
+    def _prepare_turn(self, user_query: str, filters: dict | None = None) -> dict:
+        """
+        Everything before the LLM call (blocking I/O: embeddings, vector search, warehouse).
+        Returns {"answer", "messages", "cache"}: answer is already set for cache hits and the
+        no-results fallback, otherwise messages holds the prompt to send.
+        """
         from langchain_core.messages import SystemMessage, HumanMessage
 
+        turn = {"answer": None, "messages": None, "cache": None}
+
+        # 0. Semantic answer cache: a near-identical, self-contained question against the same index
+        # Explicit filters change what the answer may be built from, so they bypass the cache
+        use_cache = self.answer_cache is not None and not filters and self._is_self_contained(user_query)
+        if use_cache:
+            query_vector = self.retriever.embed_query(user_query)
+            fingerprint = self.retriever.index_fingerprint()
+            cached = self.answer_cache.lookup(query_vector, fingerprint)
+            if cached is not None:
+                print("\n⚡ Answered from the semantic answer cache.")
+                turn["answer"] = cached
+                return turn
+            turn["cache"] = (query_vector, fingerprint)
+
         # 1. The Bait and Switch (Fetch the context!)
-        results = self.retriever.retrieve(user_query, max_cells=3)
+        routed = filters is None and self.route_queries
+        if routed:
+            filters = route_query(user_query)
+
+        results = self.retriever.retrieve(user_query, max_cells=3, upstream_depth=self.upstream_depth,
+                                          filters=filters)
+
+        # A routed filter is only a guess: if it excludes everything, search the whole notebook
+        if not results and routed and filters:
+            results = self.retriever.retrieve(user_query, max_cells=3, upstream_depth=self.upstream_depth)
 
         # 2. The Guardrail (If ChromaDB finds absolutely nothing)
         if not results:
-            fallback = "I couldn't find any relevant code or data in the notebook to answer that."
-            self.chat_history.append(("User", user_query))
-            self.chat_history.append(("Assistant", fallback))
-            return fallback
+            turn["answer"] = "I couldn't find any relevant code or data in the notebook to answer that."
+            turn["cache"] = None
+            return turn
 
         # 3. Format the retrieved context and gather our prompt pieces
-        context = self.retriever.format_for_llm(results)
-        system_prompt = self._build_system_prompt()
-        memory = self._format_memory()
+        with tracing.span("prompt_build", cells=len(results)):
+            context = self.retriever.format_for_llm(results)
+            system_prompt = self._build_system_prompt()
+            memory = self._format_memory()
 
         # 4. Construct the ultimate Human Prompt
         human_content = f"""
@@ -111,42 +219,52 @@ class NotebookChatbot:
             {context}
             """
 
-        # 5. Invoke Llama 3 70B via Groq
-        print("\n🧠 Llama 3 is analyzing your notebook...")
-        response = self.llm.invoke([
+        turn["messages"] = [
             SystemMessage(content=system_prompt),
             HumanMessage(content=human_content)
-        ])
+        ]
+        return turn
+
+    def _finish_turn(self, user_query: str, turn: dict) -> str:
+        answer = turn["answer"]
 
-        answer = response.content
+        if turn["cache"] is not None:
+            query_vector, fingerprint = turn["cache"]
+            self.answer_cache.store(query_vector, answer, fingerprint)
 
         # 6. Save this interaction to memory for the next follow-up question
-        self.chat_history.append(("User", user_query))
-        self.chat_history.append(("Assistant", answer))
+        self.memory.add(user_query, answer)
 
         return answer
 
     def clear_history(self):
         """
         The Reset Button (Optional but recommended).
-        Simply clears out self.chat_history so the user can start a fresh topic
+        Simply clears out the conversation memory so the user can start a fresh topic
         without the LLM getting confused by old context.
         """
-        self.chat_history = []
+        self.memory.clear()
         print("\n🧹 Chat history has been cleared! Starting a fresh conversation.")
 
 
-if __name__ == "__main__":
+async def chat_loop():
     bot = NotebookChatbot()
     print("\n" + "=" * 50)
     print("✅ Data Science Assistant Ready! (Type 'exit' to stop)")
     print("=" * 50)
 
     while True:
-        query = input("\n🧑‍💻 You: ")
+        query = await asyncio.to_thread(input, "\n🧑‍💻 You: ")
         if query.lower() in ['exit', 'quit']:
             print("Goodbye! 👋")
             break
 
-        answer = bot.ask(query)
-        print(f"\n🤖 Assistant:\n{answer}")
\ No newline at end of file
+        # Print the answer as it streams in
+        print("\n🤖 Assistant:")
+        async for piece in bot.astream(query):
+            print(piece, end="", flush=True)
+        print()
+
+
+if __name__ == "__main__":
+    asyncio.run(chat_loop())
@@ -0,0 +1,124 @@
+# query_filters.py: metadata filters for retrieval. A simple filter dict is translated into a Chroma
+# `where` clause (pushed into the vector search) and checked in Python for the BM25 side.
+# A cheap rule-based router derives a filter from the question itself.
+import re
+from typing import Dict, List, Tuple
+
+# Metadata every text chunk carries (see rag_document_builder.build_text_document)
+FILTER_FIELDS = ("intent", "section", "has_error", "cell_index", "notebook_path")
+
+_LIST_OPERATORS = {"$in", "$nin"}
+_RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte"}
+_OPERATORS = {"$eq", "$ne"} | _LIST_OPERATORS | _RANGE_OPERATORS
+
+# (pattern, filter) pairs, first match wins. Keep them conservative: a routed filter that
+# matches nothing falls back to an unfiltered search (see NotebookChatbot.ask).
+QUERY_ROUTES: List[Tuple[re.Pattern, Dict]] = [
+    (re.compile(r"\b(accuracy|score|precision|recall|f1|auc|roc|metrics?|confusion matrix|mse|rmse|r2)\b", re.I),
+     {"intent": ["evaluation", "model_training"]}),
+    (re.compile(r"\b(plot|chart|graph|visuali[sz]\w*|histogram|heatmap|scatter)\b", re.I),
+     {"intent": ["visualization"]}),
+    (re.compile(r"\b(traceback|exception|crash\w*)\b", re.I),
+     {"has_error": True}),
+]
+
+
+class FilterError(ValueError):
+    """An invalid filter from the caller (unknown field, operator or operand type)."""
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_operand(field: str, op: str, target):
+    if op in _LIST_OPERATORS and not isinstance(target, (list, tuple, set)):
+        raise FilterError(f"'{op}' on '{field}' needs a list, got {type(target).__name__}")
+    if op in _RANGE_OPERATORS and not _is_number(target):
+        raise FilterError(f"'{op}' on '{field}' needs a number, got {type(target).__name__}")
+
+
+def _clauses(field: str, condition) -> List[Dict]:
+    """One {field: {op: target}} clause per operator (Chroma accepts a single operator per expression)."""
+    if field not in FILTER_FIELDS:
+        raise FilterError(f"Cannot filter on '{field}', expected one of {FILTER_FIELDS}")
+
+    if isinstance(condition, dict):
+        if not condition:
+            raise FilterError(f"Empty operator dict for '{field}'")
+        unknown = set(condition) - _OPERATORS
+        if unknown:
+            raise FilterError(f"Unsupported filter operator(s) for '{field}': {sorted(unknown)}")
+        for op, target in condition.items():
+            _check_operand(field, op, target)
+        return [{field: {op: list(target) if op in _LIST_OPERATORS else target}}
+                for op, target in condition.items()]
+    if isinstance(condition, (list, tuple, set)):
+        return [{field: {"$in": list(condition)}}]
+    return [{field: {"$eq": condition}}]
+
+
+def build_where(filters: Dict | None) -> Dict | None:
+    """
+    {"intent": ["evaluation", "model_training"], "has_error": False, "cell_index": {"$gte": 10}}
+    -> {"$and": [{"intent": {"$in": [...]}}, {"has_error": {"$eq": False}}, {"cell_index": {"$gte": 10}}]}
+    A list means "any of", a scalar means equality, a dict passes Chroma operators through
+    ({"$gte": 10, "$lt": 20} becomes two clauses).
+    Raises FilterError for unknown fields or operators, a non-list $in / $nin and a non-numeric range bound.
+    """
+    if not filters:
+        return None
+    if not isinstance(filters, dict):
+        raise FilterError(f"Filters must be a dict, got {type(filters).__name__}")
+
+    clauses = [clause for field, condition in filters.items() for clause in _clauses(field, condition)]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _same(value, target) -> bool:
+    # Chroma compares types strictly: False does not equal 0
+    return value == target and isinstance(value, bool) == isinstance(target, bool)
+
+
+def _condition_holds(value, op: str, target) -> bool:
+    if op == "$eq":
+        return _same(value, target)
+    if op == "$ne":
+        return not _same(value, target)
+    if op in _LIST_OPERATORS:
+        if not isinstance(target, (list, tuple, set)):
+            return False
+        return any(_same(value, t) for t in target) == (op == "$in")
+
+    # Range operators never match a missing or non-numeric value, as in Chroma; only the requested
+    # comparison is evaluated, so mismatched types cannot raise
+    if not (_is_number(value) and _is_number(target)):
+        return False
+    if op == "$gt":
+        return value > target
+    if op == "$gte":
+        return value >= target
+    if op == "$lt":
+        return value < target
+    return value <= target
+
+
+def matches(cell: Dict, filters: Dict | None) -> bool:
+    """Python-side check of the same filter dict against a warehouse cell."""
+    if not filters:
+        return True
+
+    for field, condition in filters.items():
+        for clause in _clauses(field, condition):
+            (op, target), = clause[field].items()
+            if not _condition_holds(cell.get(field), op, target):
+                return False
+    return True
+
+
+def route_query(query: str) -> Dict | None:
+    """Filter implied by the wording of the question, or None to search everything."""
+    for pattern, filters in QUERY_ROUTES:
+        if pattern.search(query):
+            return dict(filters)
+    return None
@@ -1,12 +1,12 @@
-from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from retrieval import RelationalRetriever
+from llm_backends import get_llm
 from dotenv import load_dotenv
 load_dotenv()
 
 print("Starting Llama3:70b...")
-Chatbot = ChatGroq(model="llama-3.3-70b-versatile",
-                   temperature=0.1)
+# The chatbot's "answer" model, but without its max_tokens=2048 reply cap, as this script always ran
+Chatbot = get_llm("answer", max_tokens=None)
 
 print("Reading your jupyter notebook...")
 retriever = RelationalRetriever()
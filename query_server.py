@@ -0,0 +1,192 @@
+# query_server.py: resident query daemon. Loads the retriever (embeddings client, vector store, warehouse)
+# and the Groq client once, then answers over local HTTP, so each question only pays retrieval + LLM latency.
+# Each session gets its own NotebookChatbot (chat history), all sharing the warm retriever, LLM and answer cache.
+#
+# Usage: python query_server.py [port]        then: python query_client.py "What was the accuracy?"
+#
+#   POST /ask    {"question": "...", "session": "default", "filters": {...}}  -> {"answer", "session", "seconds"}
+#   POST /clear  {"session": "default"}                                       -> {"cleared": true}
+#   GET  /health                                                              -> {"status": "ok", ...}
+#   GET  /stats                                                               -> cache / session / latency counters
+#   GET  /metrics                                                             -> Prometheus text (NBRAG_TRACE=1)
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from query_engine import NotebookChatbot
+from query_filters import FilterError
+import llm_backends
+import tracing
+
+HOST = "127.0.0.1"  # local only: there is no authentication
+PORT = 8765
+MAX_SESSIONS = 64
+
+
+class ChatService:
+    """The warm state behind the HTTP handler: shared components plus a bounded LRU of sessions."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.started = time.time()
+        self.max_sessions = max_sessions
+
+        # The default session owns the shared retriever, LLM and answer cache
+        default = NotebookChatbot()
+        self.retriever = default.retriever
+        self.llm = default.llm
+        self.answer_cache = default.answer_cache
+
+        self._sessions = OrderedDict({"default": (default, threading.Lock())})
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.errors = 0
+        self.answer_seconds = 0.0
+
+    def session(self, session_id: str):
+        with self._lock:
+            if session_id not in self._sessions:
+                bot = NotebookChatbot(retriever=self.retriever, llm=self.llm, answer_cache=self.answer_cache)
+                self._sessions[session_id] = (bot, threading.Lock())
+                # Evict the least recently used sessions, but never the default one
+                evictable = [sid for sid in self._sessions if sid not in ("default", session_id)]
+                while len(self._sessions) > self.max_sessions and evictable:
+                    del self._sessions[evictable.pop(0)]
+            self._sessions.move_to_end(session_id)
+            return self._sessions[session_id]
+
+    def ask(self, question: str, session_id: str = "default", filters: dict | None = None) -> dict:
+        bot, session_lock = self.session(session_id)
+
+        start = time.perf_counter()
+        # One question at a time per session, so the chat history stays in order
+        with session_lock:
+            answer = bot.ask(question, filters=filters)
+        seconds = time.perf_counter() - start
+
+        with self._lock:
+            self.requests += 1
+            self.answer_seconds += seconds
+        return {"answer": answer, "session": session_id, "seconds": round(seconds, 3)}
+
+    def clear(self, session_id: str = "default") -> dict:
+        bot, session_lock = self.session(session_id)
+        with session_lock:
+            bot.clear_history()
+        return {"cleared": True, "session": session_id}
+
+    def health(self) -> dict:
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "backend": self.retriever.backend,
+            "cells": len(self.retriever.doc_store),
+            "llm": llm_backends.describe(),
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests, errors, seconds = self.requests, self.errors, self.answer_seconds
+            sessions = len(self._sessions)
+        return {
+            "sessions": sessions,
+            "requests": requests,
+            "errors": errors,
+            "mean_answer_seconds": round(seconds / requests, 3) if requests else 0.0,
+            "query_embedding_cache": self.retriever.query_cache.stats(),
+            "answer_cache": self.answer_cache.stats() if self.answer_cache else None,
+            "warehouse": self.retriever.doc_store.stats(),
+            "last_retrieval": self.retriever.last_retrieval_stats,
+            "tracing": tracing.is_enabled(),
+            "stages": tracing.summary(),
+        }
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    service: ChatService = None  # set by serve()
+
+    def _send(self, status: int, payload: dict | str):
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(payload, dict):
+            raise ValueError("request body must be a JSON object")
+        return payload
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, self.service.health())
+        elif self.path == "/stats":
+            self._send(200, self.service.stats())
+        elif self.path == "/metrics":
+            self._send(200, tracing.prometheus_text())
+        else:
+            self._send(404, {"error": f"unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        try:
+            payload = self._read_json()
+        except ValueError as e:  # json.JSONDecodeError is a ValueError
+            self._send(400, {"error": f"invalid JSON: {e}"})
+            return
+
+        session_id = str(payload.get("session") or "default")
+        filters = payload.get("filters")
+        if filters is not None and not isinstance(filters, dict):
+            self._send(400, {"error": "'filters' must be a JSON object"})
+            return
+
+        try:
+            if self.path == "/ask":
+                question = payload.get("question")
+                if question is not None and not isinstance(question, str):
+                    self._send(400, {"error": "'question' must be a string"})
+                    return
+                question = (question or "").strip()
+                if not question:
+                    self._send(400, {"error": "missing 'question'"})
+                    return
+                self._send(200, self.service.ask(question, session_id, filters))
+            elif self.path == "/clear":
+                self._send(200, self.service.clear(session_id))
+            else:
+                self._send(404, {"error": f"unknown endpoint {self.path}"})
+        except FilterError as e:  # e.g. a filter on an unknown field
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            with self.service._lock:
+                self.service.errors += 1
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def log_message(self, format, *args):
+        # One short line per request instead of the default access log
+        print(f"🌐 {self.command} {self.path} -> {args[1] if len(args) > 1 else ''}")
+
+
+def serve(host: str = HOST, port: int = PORT):
+    QueryHandler.service = ChatService()
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    print(f"✅ Query server listening on http://{host}:{port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down. Goodbye! 👋")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve(port=int(sys.argv[1]) if len(sys.argv) > 1 else PORT)
@@ -24,6 +24,7 @@ def build_code_document(cell: dict) -> Document | None:
 
     metadata = {
         "cell_id": safe_scalar(cell.get("cell_id")),
+        "notebook_path": safe_scalar(cell.get("notebook_path")),
         "cell_index": safe_scalar(cell.get("cell_index")),
         "section": safe_scalar(cell.get("section")),
         "intent": safe_scalar(cell.get("intent")),
@@ -68,6 +69,7 @@ RESULT:
 
     metadata = {
         "cell_id": safe_scalar(cell.get("cell_id")),
+        "notebook_path": safe_scalar(cell.get("notebook_path")),
         "cell_index": safe_scalar(cell.get("cell_index")),
         "section": safe_scalar(cell.get("section")),
         "intent": safe_scalar(cell.get("intent")),
@@ -1,8 +1,25 @@
-import uuid
+import hashlib
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
+import tracing
 
+
+def stable_parent_id(doc: Document, kind: str) -> str:
+    """
+    Content-derived parent id: the same cell with the same content gets the same id on every build,
+    so incremental re-indexing can tell unchanged chunks apart from new ones.
+    """
+    payload = f"{kind}\0{doc.metadata.get('cell_id')}\0{doc.page_content.strip()}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def chunk_ids(split_docs: list[Document]) -> list[str]:
+    """Stable Chroma ids for split chunks: <parent_id>-<chunk_index>."""
+    return [f"{d.metadata['parent_id']}-{d.metadata['chunk_index']}" for d in split_docs]
+
+
+@tracing.traced("split")
 def split_text_documents(
         documents: list[Document],
         chunk_size: int = 500,
@@ -19,7 +36,7 @@ def split_text_documents(
     for doc in documents:
         # 1. Generate & Attach ID to the ORIGINAL document object
         # This modification persists outside the function!
-        parent_id = str(uuid.uuid4())
+        parent_id = stable_parent_id(doc, "text")
         doc.metadata["parent_id"] = parent_id
 
         content = doc.page_content.strip()
@@ -51,6 +68,7 @@ def split_text_documents(
 
 
 # The same logic applies to split_code_documents
+@tracing.traced("split")
 def split_code_documents(
         documents: list[Document],
         max_length: int = 800
@@ -59,7 +77,7 @@ def split_code_documents(
 
     for doc in documents:
         # 1. Attach ID to Original
-        parent_id = str(uuid.uuid4())
+        parent_id = stable_parent_id(doc, "code")
         doc.metadata["parent_id"] = parent_id
 
         content = doc.page_content.strip()
@@ -1,105 +1,366 @@
-import json
+import hashlib
 import os
+import threading
 from langchain_chroma import Chroma
 from langchain_ollama import OllamaEmbeddings
+from lineage import LineageIndex, LINEAGE_PATH
+from bm25_index import BM25Index, BM25_FILENAME, reciprocal_rank_fusion
+from query_cache import QueryEmbeddingCache
+from numpy_store import NumpyVectorStore, NUMPY_STORE_DIR
+from query_filters import build_where, matches
+from warehouse import CellWarehouse, WAREHOUSE_PATH
+from context_packer import pack_context, DEFAULT_TOKEN_BUDGET
+import tracing
 
 
 class RelationalRetriever:
-    def __init__(self, persist_dir: str = "./chroma_store", doc_store_path: str = "artifacts/custom_object.json"):
+    def __init__(self, persist_dir: str = "./chroma_store", doc_store_path: str = "artifacts/custom_object.json",
+                 lineage_path: str = LINEAGE_PATH, hybrid: bool = True,
+                 query_cache_size: int = 1024, query_cache_ttl: float | None = None,
+                 backend: str = "chroma", warehouse_path: str = WAREHOUSE_PATH,
+                 context_budget: int | None = DEFAULT_TOKEN_BUDGET, embedding_function=None):
         """
         Initializes the Relational Retriever.
+        backend: "chroma" (default) or "numpy" for the in-process flat index exported by build_index.py.
+        doc_store_path: the custom_object.json warehouse; it is migrated into the SQLite warehouse at
+        warehouse_path whenever the JSON is newer, and cells are then read from SQLite on demand.
+        context_budget: token budget of format_for_llm (None = no limit).
+        embedding_function: query embedding model; defaults to Ollama bge-m3 (the model the index was built with).
         """
         print("🚀 Initializing Relational Retriever...")
 
-        # 1. Load the Embedding Model
-        self.embedding_function = OllamaEmbeddings(model="bge-m3")
+        # 1. Load the Embedding Model, with an LRU in front of it for repeated questions
+        self.embedding_function = embedding_function or OllamaEmbeddings(model="bge-m3")
+        self.query_cache = QueryEmbeddingCache(maxsize=query_cache_size, ttl=query_cache_ttl)
 
-        # 2. Connect to ChromaDB
-        self.vector_db = Chroma(
-            persist_directory=persist_dir,
-            embedding_function=self.embedding_function,
-            collection_name="notebook_text_rag"
-        )
+        self.backend = backend
+        if backend not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown vector backend '{backend}', expected 'chroma' or 'numpy'")
+        self.persist_dir = persist_dir
+        self.doc_store_path = doc_store_path
+        self.warehouse_path = warehouse_path
+        self.lineage_path = lineage_path
+        self.hybrid = hybrid
+        numpy_store_path = os.path.join(persist_dir, NUMPY_STORE_DIR)
+
+        # How the last retrieve went (see _adaptive_fetch)
+        self.last_retrieval_stats = {}
+
+        # Prompt context size limit, and what format_for_llm trimmed last time
+        self.context_budget = context_budget
+        self.last_pack_report = {}
+
+        # Files whose change means the index was rebuilt (see index_fingerprint / refresh)
+        self._index_files = [
+            doc_store_path,
+            warehouse_path,
+            lineage_path,
+            os.path.join(persist_dir, "chroma.sqlite3"),
+            os.path.join(persist_dir, BM25_FILENAME),
+            os.path.join(numpy_store_path, "meta.json"),
+        ]
+        if not os.path.exists(doc_store_path) and not os.path.exists(warehouse_path):
+            raise FileNotFoundError(f"❌ DocStore not found at {doc_store_path} or {warehouse_path}")
+
+        self._reload_lock = threading.Lock()
+        self._load_index()
+
+        print(f"✅ Retriever Ready! Loaded {len(self.doc_store)} unique cells"
+              f"{' (hybrid BM25 + vector)' if self.bm25 else ''}.")
+
+    def _load_index(self):
+        """(Re)opens everything built by build_index.py and remembers the fingerprint it was loaded at."""
+        # 2. Connect to the vector backend. Searches go through the collection-level query() API,
+        # which both the Chroma collection and the NumPy store implement.
+        if self.backend == "chroma":
+            self.vector_db = Chroma(
+                persist_directory=self.persist_dir,
+                embedding_function=self.embedding_function,
+                collection_name="notebook_text_rag"
+            )
+            self.collection = self.vector_db._collection
+        else:
+            self.vector_db = None
+            self.collection = NumpyVectorStore(os.path.join(self.persist_dir, NUMPY_STORE_DIR))
 
-        # 3. Load the Pure JSON Warehouse
-        if not os.path.exists(doc_store_path):
-            raise FileNotFoundError(f"❌ DocStore not found at {doc_store_path}")
+        # Upper bound for the adaptive over-fetch (also refreshed by every _adaptive_fetch)
+        self.chunk_count = self.collection.count()
 
-        with open(doc_store_path, "r", encoding="utf-8") as f:
-            self.doc_store = json.load(f)
+        # 3. Open the indexed cell warehouse (cells are fetched by cell_id, never loaded all at once)
+        self.doc_store = CellWarehouse(self.warehouse_path)
+        if os.path.exists(self.doc_store_path) and self.doc_store.is_stale(self.doc_store_path):
+            self.doc_store.migrate_json(self.doc_store_path)
 
-        print(f"✅ Retriever Ready! Loaded {len(self.doc_store)} unique cells.")
+        # 4. Load the precomputed def-use lineage (optional, built by build_index.py)
+        self.lineage = LineageIndex.load(self.lineage_path) if os.path.exists(self.lineage_path) else None
+
+        # 5. Load the persisted BM25 index that lives next to the Chroma store (hybrid search)
+        bm25_path = os.path.join(self.persist_dir, BM25_FILENAME)
+        self.bm25 = BM25Index.load(bm25_path) if self.hybrid and os.path.exists(bm25_path) else None
+
+        # After the migration above, which itself rewrites the warehouse file
+        self._loaded_fingerprint = self.index_fingerprint()
+
+    def refresh(self) -> bool:
+        """
+        Reloads the index when its files changed since it was loaded (a rebuild or incremental update
+        while a long-lived retriever, e.g. query_server.py, kept running). Returns True if it reloaded.
+        Called at the start of every retrieve; costs a few stat() calls when nothing changed.
+        """
+        if self.index_fingerprint() == self._loaded_fingerprint:
+            return False
+        with self._reload_lock:
+            if self.index_fingerprint() == self._loaded_fingerprint:
+                return False
+            with tracing.span("index_reload", backend=self.backend):
+                self._load_index()
+        print(f"♻️ Index changed on disk, reloaded: {len(self.doc_store)} cells, {self.chunk_count} chunks.")
+        return True
 
     def retrieve_debug(self, query: str, k: int = 3):
         """Diagnostic tool to expose the raw math and chunk text."""
         print(f"\n🔎 DEBUG QUERYING: '{query}'")
 
         # 1. Check the DB size
-        total_chunks = self.vector_db._collection.count()
-        print(f"📊 Total chunks in ChromaDB: {total_chunks}")
+        total_chunks = self.collection.count()
+        print(f"📊 Total chunks in {self.backend}: {total_chunks}")
 
         # 2. Perform raw similarity search to expose the distance scores!
-        results = self.vector_db.similarity_search_with_score(query, k=k)
+        results = self.collection.query(
+            query_embeddings=[self.embed_query(query)],
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
 
-        for i, (chunk, distance) in enumerate(results):
-            cell_id = chunk.metadata.get("cell_id", "UNKNOWN")
+        for i, (text, metadata, distance) in enumerate(
+                zip(results["documents"][0], results["metadatas"][0], results["distances"][0])):
+            cell_id = metadata.get("cell_id", "UNKNOWN")
             # Print the math score and a snippet of the text
-            print(f"   [{i + 1}] Distance: {distance:.4f} | Cell: {cell_id} | Text: {chunk.page_content[:60]}...")
+            print(f"   [{i + 1}] Distance: {distance:.4f} | Cell: {cell_id} | Text: {text[:60]}...")
 
         return []  # Just returning empty for now since we are just debugging
 
-    def retrieve(self, query: str, max_cells: int = 3):
-        print(f"\n🔎 Querying: '{query}'")
+    def index_fingerprint(self) -> str:
+        """Cheap version stamp of the index (sizes + mtimes of its files); changes on every rebuild."""
+        parts = []
+        for path in self._index_files:
+            if os.path.exists(path):
+                stat = os.stat(path)
+                parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+        return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
 
-        # 1. Over-fetch: Ask Chroma for 15 chunks using standard similarity search
-        results = self.vector_db.similarity_search(query, k=15)
+    def embed_query(self, query: str):
+        """Query embedding, served from the LRU when the (normalized) question was seen before."""
+        embedding = self.query_cache.get(query)
+        tracing.count("query_embed_cache", result="miss" if embedding is None else "hit")
+        if embedding is None:
+            with tracing.span("query_embed", queries=1):
+                embedding = self.embedding_function.embed_query(query)
+            self.query_cache.put(query, embedding)
+        return embedding
 
-        final_results = []
-        seen_cell_ids = set()
+    def embed_queries(self, queries):
+        """Embeddings for several questions: cache hits first, then ONE batched call for the rest."""
+        embeddings = [self.query_cache.get(query) for query in queries]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
 
-        for chunk in results:
-            cell_id = chunk.metadata.get("cell_id")
+        tracing.count("query_embed_cache", len(queries) - len(missing), result="hit")
+        tracing.count("query_embed_cache", len(missing), result="miss")
+        if missing:
+            with tracing.span("query_embed", queries=len(missing)):
+                fresh = self.embedding_function.embed_documents([queries[i] for i in missing])
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+                self.query_cache.put(queries[i], embedding)
 
-            # Skip if there's no ID, or if we already grabbed this Parent Cell
-            if not cell_id or cell_id in seen_cell_ids:
-                continue
+        return embeddings
 
-            # 2. Deduplication: We found a brand new unique Parent Cell!
-            seen_cell_ids.add(cell_id)
+    @tracing.traced("retrieve")
+    def retrieve(self, query: str, max_cells: int = 3, upstream_depth: int = 0, max_upstream: int = 3,
+                 filters: dict | None = None):
+        """
+        filters: optional metadata filter, e.g. {"intent": ["evaluation"], "has_error": False}
+        (see query_filters.build_where). It is pushed into the vector search as a `where` clause.
+        """
+        print(f"\n🔎 Querying: '{query}'" + (f" | filters: {filters}" if filters else ""))
+        self.refresh()
 
-            # 3. The Switch: Fetch the rich, uncut payload directly from JSON
-            if cell_id in self.doc_store:
-                full_cell = self.doc_store[cell_id]
-                final_results.append(full_cell)
-            else:
-                print(f"❌ [DEBUG] ERROR: cell_id {cell_id} is NOT in custom_object.json!")
+        # 1. Adaptive over-fetch: widen k only while distinct Parent Cells are still missing
+        # The search runs on the cached vector, so a repeated question never reaches Ollama
+        ranked, stats = self._adaptive_fetch([self.embed_query(query)], max_cells, build_where(filters))
+        self.last_retrieval_stats = stats
 
-            # 4. Stop exactly when we hit our target number of UNIQUE cells
-            if len(final_results) == max_cells:
-                break
+        final_results = self._select_cells(query, ranked[0], max_cells, filters)
+        print(f"🛠️ [DEBUG] Successfully grabbed {len(final_results)} unique parent cells "
+              f"in {stats['rounds']} round(s), {stats['chunks_fetched']} chunks fetched.")
+
+        # 5. Lineage expansion: add the cells the hits depend on, without another vector search
+        if upstream_depth and self.lineage:
+            final_results += self._expand_upstream(final_results, upstream_depth, max_upstream)
 
-        print(f"🛠️ [DEBUG] Successfully grabbed {len(final_results)} unique parent cells.")
         return final_results
 
-    def format_for_llm(self, retrieved_results):
+    @tracing.traced("retrieve")
+    def retrieve_many(self, queries, max_cells: int = 3, upstream_depth: int = 0, max_upstream: int = 3,
+                      filters: dict | None = None):
+        """
+        Batch version of retrieve for evaluation / batch-QA jobs: one batched embedding call and
+        one multi-vector search for all queries. Returns one list of cells per query, in input order.
+        The same filters apply to every query.
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        print(f"\n🔎 Batch querying {len(queries)} questions")
+        self.refresh()
+
+        ranked, stats = self._adaptive_fetch(self.embed_queries(queries), max_cells, build_where(filters))
+        self.last_retrieval_stats = stats
+
+        batch = []
+        for query, cell_ids in zip(queries, ranked):
+            cells = self._select_cells(query, cell_ids, max_cells, filters)
+            if upstream_depth and self.lineage:
+                cells += self._expand_upstream(cells, upstream_depth, max_upstream)
+            batch.append(cells)
+
+        return batch
+
+    def _adaptive_fetch(self, embeddings, max_cells: int, where: dict | None = None):
         """
-        Injects the uncut code, explanations, and outputs into a beautiful prompt.
+        Ranked distinct parent cell_ids per query embedding, with as few chunk fetches as possible.
+        Round 1 asks for 2 * max_cells chunks; every further round doubles k, and only for the
+        queries that still have fewer than max_cells distinct cells in the doc store.
+        All pending queries of a round go to the backend as one multi-vector query.
         """
-        prompt_context = ""
-        for i, item in enumerate(retrieved_results):
-            prompt_context += f"--- FULL CONTEXT FOR CELL {item.get('cell_id')} ---\n"
+        ranked = [[] for _ in embeddings]
+        rounds = [0] * len(embeddings)
+        chunks_fetched = 0
 
-            # Injecting the rich semantic data
-            prompt_context += f"[INTENT / PURPOSE]:\n{item.get('purpose', 'N/A')}\n\n"
-            prompt_context += f"[EXPLANATION]:\n{item.get('explanation', 'N/A')}\n\n"
+        # Re-read on every call (a cheap count): a long-lived retriever (query_server.py) must see
+        # chunks added by a rebuild or incremental update, or k would stay capped at the old size
+        self.chunk_count = self.collection.count()
 
-            # Injecting the exact Python code
-            prompt_context += f"[PYTHON CODE]:\n```python\n{item.get('source', 'No code')}\n```\n\n"
+        pending = list(range(len(embeddings))) if self.chunk_count else []
+        k = max(2 * max_cells, 4)
+
+        while pending:
+            k = min(k, self.chunk_count)
+            with tracing.span("vector_search", backend=self.backend, k=k, queries=len(pending),
+                              filtered=where is not None):
+                results = self.collection.query(
+                    query_embeddings=[embeddings[i] for i in pending],
+                    n_results=k,
+                    where=where,
+                    include=["metadatas"]
+                )
+
+            still_missing = []
+            for i, metadatas in zip(pending, results["metadatas"]):
+                rounds[i] += 1
+                chunks_fetched += len(metadatas)
+
+                # 2. Deduplication: keep each Parent Cell once, in rank order
+                ranked[i] = self._unique_cell_ids(metadatas)
+                found = len(self.doc_store.get_many(ranked[i]))
+
+                # Widen only if short AND the backend could still return more chunks
+                if found < max_cells and len(metadatas) == k < self.chunk_count:
+                    still_missing.append(i)
+
+            pending = still_missing
+            k *= 2
+
+        stats = {
+            "rounds": max(rounds, default=0),
+            "rounds_per_query": rounds,
+            "chunks_fetched": chunks_fetched,
+            "final_k": min(k // 2, self.chunk_count),
+        }
+        return ranked, stats
+
+    def _select_cells(self, query: str, ranked_cell_ids, max_cells: int, filters: dict | None = None):
+        """Fuse + switch for one query's ranked parent cell_ids."""
+        # Hybrid: fuse the vector ranking with the BM25 ranking over the warehouse
+        if self.bm25:
+            # BM25 has no metadata, so filter its hits against the warehouse cells instead
+            with tracing.span("bm25_search"):
+                lexical_hits = self.bm25.search(query, k=60 if filters else 15)
+                lexical_cell_ids = [
+                    cell_id for cell_id, _ in lexical_hits
+                    if not filters or (cell_id in self.doc_store and matches(self.doc_store[cell_id], filters))
+                ][:15]
+            ranked_cell_ids = reciprocal_rank_fusion([ranked_cell_ids, lexical_cell_ids])
+
+        final_results = []
+
+        with tracing.span("warehouse_lookup") as span:
+            for cell_id in ranked_cell_ids:
+                # 3. The Switch: Fetch the rich, uncut payload directly from JSON
+                if cell_id in self.doc_store:
+                    full_cell = self.doc_store[cell_id]
+                    final_results.append(full_cell)
+                else:
+                    print(f"❌ [DEBUG] ERROR: cell_id {cell_id} is NOT in custom_object.json!")
+
+                # 4. Stop exactly when we hit our target number of UNIQUE cells
+                if len(final_results) == max_cells:
+                    break
+            span.set(cells=len(final_results))
+
+        return final_results
+
+    @staticmethod
+    def _unique_cell_ids(metadatas):
+        ranked, seen = [], set()
+        for metadata in metadatas:
+            cell_id = (metadata or {}).get("cell_id")
+
+            # Skip if there's no ID, or if we already grabbed this Parent Cell
+            if cell_id and cell_id not in seen:
+                seen.add(cell_id)
+                ranked.append(cell_id)
+        return ranked
+
+    def _expand_upstream(self, hits, depth: int, max_upstream: int):
+        seen = {cell.get("cell_id") for cell in hits}
+
+        # Rank every hit's parents before cutting to max_upstream: direct producers of all hits
+        # (fewest hops, closest above) come before the deeper imports / loading cells of the top hit
+        candidates = {}  # cell_id -> (hops, distance, hit rank)
+        for rank, cell in enumerate(hits):
+            for cell_id, hops, distance in self.lineage.upstream_ranked(cell.get("cell_id"), depth=depth):
+                if cell_id not in seen:
+                    key = (hops, distance, rank)
+                    candidates[cell_id] = min(key, candidates.get(cell_id, key))
+
+        upstream = []
+        for cell_id in sorted(candidates, key=candidates.get):
+            if len(upstream) == max_upstream:
+                break
+            if cell_id in self.doc_store:
+                upstream.append(self.doc_store[cell_id])
+
+        print(f"🧬 [DEBUG] Added {len(upstream)} upstream cells from the lineage index.")
+
+        # Upstream cells read best in notebook order
+        return sorted(upstream, key=lambda c: c.get("cell_index", -1))
+
+    def format_for_llm(self, retrieved_results, token_budget: int | None = None):
+        """
+        Injects the code, explanations, and outputs into a beautiful prompt, within the token budget
+        (token_budget, else self.context_budget). What had to be trimmed is kept in self.last_pack_report.
+        """
+        budget = token_budget if token_budget is not None else self.context_budget
+        prompt_context, self.last_pack_report = pack_context(retrieved_results, budget)
 
-            # Injecting the newly cleaned outputs and result summaries!
-            prompt_context += f"[TERMINAL OUTPUT]:\n{item.get('outputs', 'No output')}\n\n"
-            prompt_context += f"[STATISTICAL RESULT]:\n{item.get('result_summary', 'N/A')}\n"
-            prompt_context += "------------------------------------------\n\n"
+        report = self.last_pack_report
+        tracing.count("context_tokens", report["tokens_after"])
+        tracing.count("context_tokens_trimmed", report["tokens_before"] - report["tokens_after"])
+        if report["dropped"] or report["truncated"] or report["cells_dropped"]:
+            print(f"✂️ [DEBUG] Context packed from {report['tokens_before']} to {report['tokens_after']} tokens "
+                  f"(budget {budget}): {len(report['dropped'])} fields dropped, "
+                  f"{len(report['truncated'])} truncated, {len(report['cells_dropped'])} cells dropped.")
 
         return prompt_context
 
@@ -0,0 +1,57 @@
+import ast
+
+from analyzer import _parse_cell_source, analyze_code_cell, mask_ipython_syntax
+
+
+def analyze(source: str) -> dict:
+    return analyze_code_cell({"type": "code", "source": source})
+
+
+def test_plain_python_is_never_masked():
+    source = 'rate = 0.5\nprint(f"{rate:.0%} done")  # not a %magic\nlabel = "what?"\n'
+
+    assert ast.dump(_parse_cell_source(source)) == ast.dump(ast.parse(source))
+
+
+def test_plain_python_signals_match_an_ast_walk():
+    source = (
+        "import pandas as pd\n"
+        "df = pd.read_csv(path)\n"
+        "for col in df.columns:\n"
+        "    df[col] = scale(df[col])\n"
+        "model.fit(df, y)\n"
+    )
+    tree = ast.parse(source)
+
+    cell = analyze(source)
+
+    used = {n.id for n in ast.walk(tree) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load)}
+    assert cell["used"] == sorted(used)
+    assert cell["defined"] == ["col", "df", "pd"]
+    assert cell["called_symbols"] == ["model.fit", "pd.read_csv", "scale"]
+    assert cell["external_inputs"] == ["model", "path", "scale", "y"]
+
+
+def test_timed_line_magics_keep_the_statement():
+    cell = analyze("%time y_pred = model.predict(X_test)")
+    assert cell["defined"] == ["y_pred"]
+    assert cell["called_symbols"] == ["model.predict"]
+    assert cell["external_inputs"] == ["X_test", "model"]
+
+    cell = analyze("%timeit -n 10 -r 3 evaluate(clf, X)")
+    assert cell["called_symbols"] == ["evaluate"]
+    assert cell["external_inputs"] == ["X", "clf", "evaluate"]
+
+
+def test_other_ipython_syntax_is_masked():
+    cell = analyze("%matplotlib inline\n!pip install seaborn\nfiles = !ls\ndf?\nplt.plot(files)")
+
+    assert cell["defined"] == ["files"]
+    assert cell["called_symbols"] == ["plt.plot"]
+    assert cell["external_inputs"] == ["plt"]
+
+
+def test_non_python_cell_magics_are_skipped():
+    assert mask_ipython_syntax("%%bash\nls -la") is None
+    assert analyze("%%bash\nls -la")["defined"] == []
+    assert analyze("%%time\nx = train(df)")["defined"] == ["x"]
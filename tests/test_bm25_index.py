@@ -0,0 +1,40 @@
+from bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+CELLS = [
+    {"cell_id": "load", "source": "df = pd.read_csv('iris.csv')", "purpose": "Loads the iris dataset"},
+    {"cell_id": "grid", "source": "search = GridSearchCV(SVC(), param_grid)\nsearch.fit(X_train, y_train)",
+     "purpose": "Tunes the SVM hyperparameters", "called_symbols": ["GridSearchCV", "search.fit"]},
+    {"cell_id": "score", "source": "acc = accuracy_score(y_test, y_pred)", "explanation": "Computes the accuracy"},
+]
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert tokenize("GridSearchCV") == ["gridsearchcv", "grid", "search", "cv"]
+    assert tokenize("X_train") == ["x_train", "x", "train"]
+    assert tokenize("the model of 0.97") == ["model", "0.97", "0", "97"]
+
+
+def test_search_ranks_exact_identifiers_first():
+    index = BM25Index.build(CELLS)
+
+    assert index.search("GridSearchCV")[0][0] == "grid"
+    assert index.search("accuracy_score")[0][0] == "score"
+    assert index.search("read_csv iris")[0][0] == "load"
+    assert index.search("nonexistentword") == []
+
+
+def test_save_load_round_trip(tmp_path):
+    index = BM25Index.build(CELLS)
+    path = str(tmp_path / "bm25_index.json")
+    index.save(path)
+
+    assert BM25Index.load(path).search("accuracy", k=3) == index.search("accuracy", k=3)
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "d"]])
+
+    assert fused[0] == "b"
+    assert fused[-1] == "d"
+    assert set(fused) == {"a", "b", "c", "d"}
+    assert reciprocal_rank_fusion([]) == []
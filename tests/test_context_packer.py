@@ -0,0 +1,79 @@
+from context_packer import _TRUNCATED, clip_to_tokens, count_tokens, pack_context
+
+PROSE = " ".join(["the", "standardization", "of", "classification", "hyperparameters"] * 160)  # one 800-word line
+
+
+def test_clip_cuts_a_single_line_at_word_boundaries():
+    clipped = clip_to_tokens(PROSE, 100)
+
+    assert clipped.endswith(_TRUNCATED)
+    assert clipped != _TRUNCATED
+    assert 90 <= count_tokens(clipped) <= 100
+    assert PROSE.startswith(clipped[:-len(_TRUNCATED)].rstrip())
+
+
+def test_clip_keeps_whole_lines_when_they_fit():
+    text = "first line\nsecond line\n" + PROSE
+
+    assert clip_to_tokens(text, 50) == f"first line\nsecond line\n{_TRUNCATED}"
+    assert clip_to_tokens("short", 50) == "short"
+
+
+def test_single_line_explanation_is_trimmed_not_lost():
+    cell = {"cell_id": "a", "purpose": "Scales the features", "explanation": PROSE, "source": "x = 1"}
+
+    context, report = pack_context([cell], budget=1500)
+
+    assert report["tokens_before"] > 1500
+    assert 1400 <= report["tokens_after"] <= 1500
+    assert report["truncated"] == [("a", "explanation")]
+    assert report["dropped"] == []
+    assert "classification hyperparameters" in context
+
+
+def test_single_line_top_cell_source_is_trimmed_not_lost():
+    source = "result = f(" + ", ".join(f"arg{i}" for i in range(2000)) + ")"
+
+    context, report = pack_context([{"cell_id": "a", "source": source}], budget=300)
+
+    assert ("a", "source") in report["truncated"]
+    assert report["tokens_after"] <= 300
+    assert "result = f(arg0, arg1," in context
+
+
+def test_field_left_with_only_the_marker_is_reported_dropped():
+    context, report = pack_context([{"cell_id": "a", "source": "A" * 5000}], budget=100)
+
+    assert ("a", "source") in report["dropped"]
+    assert ("a", "source") not in report["truncated"]
+    assert _TRUNCATED not in context
+
+
+def _ranked_cell(cell_id):
+    return {
+        "cell_id": cell_id,
+        "purpose": f"Evaluates model {cell_id}",
+        "explanation": PROSE[:2000],
+        "source": "scores = cross_val_score(model, X, y, cv=5)\nprint(scores.mean())",
+        "outputs": "\n".join(f"fold {k}: accuracy 0.97{k} precision 0.96{k} recall 0.95{k}" for k in range(10)),
+        "result_summary": f"Model {cell_id} reaches a mean accuracy of 0.9731",
+    }
+
+
+def test_low_ranked_cells_go_before_the_top_cells_metrics():
+    context, report = pack_context([_ranked_cell(c) for c in ("a", "b", "c")], budget=500)
+
+    assert report["tokens_after"] <= 500
+    assert report["cells_dropped"] == ["c"]
+    assert "Model a reaches a mean accuracy of 0.9731" in context
+    assert not {("a", "outputs"), ("a", "result_summary")} & set(report["dropped"] + report["truncated"])
+
+
+def test_stale_token_counts_are_recounted():
+    source = "\n".join(f"feature_{i} = frame['column_{i}'].fillna(0) * weights[{i}]" for i in range(300))
+    cell = {"cell_id": "a", "source": source, "token_counts": {"source": 1, "outputs": 1}}
+
+    context, report = pack_context([cell], budget=200)
+
+    assert report["tokens_before"] > 3000
+    assert count_tokens(context) <= 200
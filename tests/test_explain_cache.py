@@ -0,0 +1,36 @@
+import json
+
+from explain_cache import CACHED_FIELDS, ExplanationCache, explanation_key
+
+FIELDS = {"purpose": "Loads the data", "explanation": "Reads the CSV", "result_summary": "None", "intent": "data_loading"}
+
+
+def test_round_trip_and_key_depends_on_model(tmp_path):
+    cache = ExplanationCache(tmp_path)
+    key = explanation_key("df = load()", "No output.", "prompt", "llama3:8b")
+
+    cache.put(key, FIELDS)
+
+    assert cache.get(key) == FIELDS
+    assert explanation_key("df = load()", "No output.", "prompt", "stub:llama3:8b") != key
+
+
+def test_malformed_entries_are_misses(tmp_path):
+    cache = ExplanationCache(tmp_path)
+    cache.put("ab01", FIELDS)
+    path = cache._path("ab01")
+
+    for content in ('{"purpose": "only one field"}', "[1, 2]", "{not json", json.dumps({**FIELDS, "intent": None})):
+        path.write_text(content, encoding="utf-8")
+        assert cache.get("ab01") is None
+
+    path.write_bytes(b"\xff\xfe\x00")
+    assert cache.get("ab01") is None
+    assert cache.stats()["misses"] == 5
+
+
+def test_put_stores_only_cached_fields(tmp_path):
+    cache = ExplanationCache(tmp_path)
+    cache.put("cd02", {**FIELDS, "source": "x = 1", "explanation_error": False})
+
+    assert set(cache.get("cd02")) == set(CACHED_FIELDS)
@@ -0,0 +1,54 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from index_builder import build_collection, diff_custom_objects, update_collection
+from rag_text_splitter import chunk_ids, split_code_documents, split_text_documents
+
+
+def _doc(cell_id, text):
+    return Document(page_content=text, metadata={"cell_id": cell_id})
+
+
+def test_diff_custom_objects():
+    old = {"a": {"source": "x = 1"}, "b": {"source": "y = 2"}, "c": {"source": "z = 3"}}
+    new = {"a": {"source": "x = 1"}, "b": {"source": "y = 20"}, "d": {"source": "w = 4"}}
+
+    assert diff_custom_objects(old, new) == {"added": ["d"], "changed": ["b"], "removed": ["c"]}
+    assert diff_custom_objects(new, new) == {"added": [], "changed": [], "removed": []}
+
+
+def test_chunk_ids_are_stable_and_content_derived():
+    long_text = "\n\n".join(f"Paragraph {i} " + "word " * 60 for i in range(4))
+
+    first = chunk_ids(split_text_documents([_doc("a", long_text), _doc("b", "short")]))
+    again = chunk_ids(split_text_documents([_doc("a", long_text), _doc("b", "short")]))
+    edited = chunk_ids(split_text_documents([_doc("a", long_text + " more"), _doc("b", "short")]))
+
+    assert first == again
+    assert len(set(first)) == len(first)
+    assert first[-1] == edited[-1]  # cell b is untouched
+    assert not set(first[:-1]) & set(edited[:-1])
+
+
+def test_chunk_ids_differ_between_text_and_code_and_between_cells():
+    text_ids = chunk_ids(split_text_documents([_doc("a", "df.head()")]))
+    code_ids = chunk_ids(split_code_documents([_doc("a", "df.head()")]))
+    other_cell = chunk_ids(split_code_documents([_doc("b", "df.head()")]))
+
+    assert text_ids != code_ids
+    assert code_ids != other_cell
+
+
+def test_update_collection_replaces_only_dirty_cells(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    persist_dir = str(tmp_path / "chroma")
+    old = {"a": "x = 1", "b": "y = 2", "c": "z = 3"}
+    new = {"a": "x = 1", "b": "y = 20", "d": "w = 4"}
+
+    build_collection(split_code_documents([_doc(k, v) for k, v in old.items()]), embeddings, "code", persist_dir)
+    docs = split_code_documents([_doc(k, v) for k, v in new.items()])
+    db = update_collection(docs, embeddings, "code", diff_custom_objects(old, new), persist_dir)
+
+    stored = db.get()
+    assert sorted(stored["ids"]) == sorted(chunk_ids(docs))
+    assert sorted(stored["documents"]) == sorted(new.values())
@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+from lineage import LineageIndex, build_lineage_index
+from retrieval import RelationalRetriever
+
+
+def cell(cell_id, index, defined=(), used=(), notebook="nb.ipynb"):
+    return {"cell_id": cell_id, "cell_index": index, "notebook_path": notebook,
+            "defined": list(defined), "used": list(used)}
+
+
+CELLS = [
+    cell("imports", 0, defined=["pd", "SVC"]),
+    cell("load", 1, defined=["df"], used=["pd"]),
+    cell("reload", 2, defined=["df"], used=["pd"]),
+    cell("split", 3, defined=["X", "y"], used=["df"]),
+    cell("train", 4, defined=["model"], used=["SVC", "X", "y"]),
+    cell("predict", 5, defined=["pred"], used=["model", "X"]),
+    cell("score", 6, defined=["acc"], used=["pred", "y"]),
+]
+
+
+def test_edges_point_to_the_latest_earlier_definition():
+    index = LineageIndex(build_lineage_index(CELLS))
+
+    assert index.upstream("split") == ["reload"]  # not "load", which defined df first
+    assert index.upstream("reload") == ["imports"]
+    assert index.upstream("unknown") == []
+
+
+def test_lineage_does_not_cross_notebooks():
+    cells = [cell("a_def", 0, defined=["df"], notebook="a.ipynb"),
+             cell("b_use", 1, used=["df"], notebook="b.ipynb")]
+
+    assert LineageIndex(build_lineage_index(cells)).upstream("b_use") == []
+
+
+def test_upstream_orders_by_hop_then_nearest():
+    index = LineageIndex(build_lineage_index(CELLS))
+
+    assert index.upstream_ranked("score", depth=2) == [
+        ("predict", 1, 1), ("split", 1, 3), ("train", 2, 2), ("reload", 2, 4),
+    ]
+    assert index.upstream("train") == ["split", "imports"]
+
+
+def test_expand_upstream_prefers_direct_producers_of_every_hit():
+    index = LineageIndex(build_lineage_index(CELLS))
+    doc_store = {c["cell_id"]: c for c in CELLS}
+    retriever = SimpleNamespace(lineage=index, doc_store=doc_store)
+    hits = [doc_store["train"], doc_store["score"]]
+
+    upstream = RelationalRetriever._expand_upstream(retriever, hits, 2, 2)
+
+    # Hop-1 parents of both hits beat the top hit's other parents (imports) and deeper ancestors
+    assert [c["cell_id"] for c in upstream] == ["split", "predict"]
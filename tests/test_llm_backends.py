@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from langchain_core.prompts import ChatPromptTemplate
+
+import llm_backends
+from llm_backends import RetryingLLM, StubChatModel
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_backends, "_backoff", lambda attempt: 0)
+
+
+class FlakyModel:
+    """Fails (or hangs) on the first `failures` calls, then answers."""
+
+    def __init__(self, failures, error=None, hang=0.0):
+        self.failures = failures
+        self.error = error
+        self.hang = hang
+        self.calls = 0
+
+    def invoke(self, input, config=None, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return "ok"
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            await asyncio.sleep(self.hang)
+        return "ok"
+
+
+def test_composes_with_prompts():
+    llm = RetryingLLM(StubChatModel(), "answer", "stub", "stub")
+    chain = ChatPromptTemplate.from_messages([("system", "{context}"), ("human", "{question}")]) | llm
+
+    reply = chain.invoke({"context": "--- FULL CONTEXT FOR CELL c1 ---", "question": "What does it do?"})
+
+    assert reply.content.endswith("based on cells c1.")
+    assert "".join(chunk.content for chunk in chain.stream({"context": "", "question": "?"})).startswith("Stub")
+
+
+def test_transient_errors_are_retried_others_are_not():
+    flaky = FlakyModel(failures=2, error=ConnectionError("reset"))
+    assert RetryingLLM(flaky, "answer", "x", "m", retries=2).invoke("q") == "ok"
+
+    broken = FlakyModel(failures=1, error=KeyError("bug"))
+    with pytest.raises(KeyError):
+        RetryingLLM(broken, "answer", "x", "m", retries=2).invoke("q")
+    assert broken.calls == 1
+
+
+def test_timeout_applies_to_each_attempt():
+    slow = FlakyModel(failures=2, hang=1.0)
+    llm = RetryingLLM(slow, "explain", "x", "m", retries=2)
+
+    assert asyncio.run(llm.ainvoke("q", attempt_timeout=0.05)) == "ok"
+    assert slow.calls == 3
+
+    slow = FlakyModel(failures=5, hang=1.0)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(RetryingLLM(slow, "explain", "x", "m", retries=1).ainvoke("q", attempt_timeout=0.05))
+    assert slow.calls == 2
+
+
+def test_overrides_get_their_own_shared_model(monkeypatch):
+    monkeypatch.setenv("NBRAG_ANSWER_BACKEND", "stub")
+    monkeypatch.setattr(llm_backends, "_models", {})
+
+    capped = llm_backends.get_llm("answer")
+    uncapped = llm_backends.get_llm("answer", max_tokens=None)
+
+    assert uncapped is not capped
+    assert uncapped is llm_backends.get_llm("answer", max_tokens=None)
+    assert llm_backends.role_settings("answer", max_tokens=None)["max_tokens"] is None
+    with pytest.raises(ValueError):
+        llm_backends.get_llm("answer", top_p=0.9)
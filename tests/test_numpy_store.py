@@ -0,0 +1,49 @@
+import numpy as np
+
+from numpy_store import NumpyVectorStore
+
+
+def make_store(tmp_path, metadatas, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = [f"id{i}" for i in range(len(metadatas))]
+    vectors = rng.normal(size=(len(ids), dim))
+    NumpyVectorStore.write(str(tmp_path), ids, vectors, [f"doc {i}" for i in range(len(ids))], metadatas)
+    return NumpyVectorStore(str(tmp_path)), ids, vectors
+
+
+def test_query_ranks_by_cosine_similarity(tmp_path):
+    store, ids, vectors = make_store(tmp_path, [{"cell_id": f"c{i}"} for i in range(30)])
+    query = np.random.default_rng(1).normal(size=vectors.shape[1])
+
+    result = store.query([query], n_results=5)
+
+    cosine = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    expected = [ids[i] for i in np.argsort(-cosine)[:5]]
+    assert result["ids"][0] == expected
+    assert np.allclose(result["distances"][0], 1 - np.sort(cosine)[::-1][:5], atol=1e-5)
+    assert result["metadatas"][0][0] == {"cell_id": expected[0].replace("id", "c")}
+
+
+def test_where_mask(tmp_path):
+    metadatas = [{"cell_id": f"c{i}", "intent": "evaluation" if i % 3 == 0 else "preprocessing",
+                  "cell_index": i} for i in range(12)]
+    store, ids, _ = make_store(tmp_path, metadatas)
+
+    where = {"$and": [{"intent": {"$eq": "evaluation"}}, {"cell_index": {"$gte": 4}}]}
+    assert [ids[i] for i in np.flatnonzero(store._mask(where))] == ["id6", "id9"]
+
+    where = {"$or": [{"cell_index": {"$lt": 2}}, {"cell_index": {"$in": [10]}}]}
+    assert [ids[i] for i in np.flatnonzero(store._mask(where))] == ["id0", "id1", "id10"]
+
+    result = store.query([np.ones(8)], n_results=10, where={"intent": {"$eq": "evaluation"}})
+    assert sorted(result["ids"][0]) == ["id0", "id3", "id6", "id9"]
+
+
+def test_bools_and_ints_stay_distinct(tmp_path):
+    metadatas = [{"flag": False}, {"flag": 0}, {"flag": True}, {"flag": 1}]
+    store, ids, _ = make_store(tmp_path, metadatas)
+
+    assert [store._metadata(i)["flag"] for i in range(4)] == [False, 0, True, 1]
+    assert [type(store._metadata(i)["flag"]) for i in range(4)] == [bool, int, bool, int]
+    assert list(np.flatnonzero(store._mask({"flag": {"$eq": False}}))) == [0]
+    assert list(np.flatnonzero(store._mask({"flag": {"$in": [1]}}))) == [3]
@@ -0,0 +1,113 @@
+import random
+import uuid
+
+import chromadb
+import numpy as np
+import pytest
+
+from numpy_store import NumpyVectorStore
+from query_filters import FilterError, build_where, matches, route_query
+
+
+# --------------------------------------------------
+# build_where / matches
+# --------------------------------------------------
+def test_build_where_shapes():
+    assert build_where(None) is None
+    assert build_where({"intent": "evaluation"}) == {"intent": {"$eq": "evaluation"}}
+    assert build_where({"intent": ("a", "b")}) == {"intent": {"$in": ["a", "b"]}}
+    assert build_where({"has_error": False, "cell_index": {"$gte": 10, "$lt": 20}}) == {"$and": [
+        {"has_error": {"$eq": False}}, {"cell_index": {"$gte": 10}}, {"cell_index": {"$lt": 20}},
+    ]}
+
+
+@pytest.mark.parametrize("filters", [
+    {"unknown_field": 1},
+    {"intent": {"$regex": "eval"}},
+    {"intent": {"$in": "evaluation"}},
+    {"intent": {"$nin": "evaluation"}},
+    {"cell_index": {"$gt": "5"}},
+    {"cell_index": {"$lte": True}},
+    {"cell_index": {}},
+    "intent=evaluation",
+])
+def test_build_where_rejects_invalid_filters(filters):
+    with pytest.raises(FilterError):
+        build_where(filters)
+
+
+def test_matches_semantics():
+    cell = {"intent": "evaluation", "has_error": False, "cell_index": 12, "section": "Model"}
+
+    assert matches(cell, None)
+    assert matches(cell, {"intent": ["evaluation", "visualization"], "cell_index": {"$gte": 10, "$lt": 20}})
+    assert not matches(cell, {"cell_index": {"$gte": 10, "$lt": 12}})
+    assert matches(cell, {"intent": {"$nin": ["visualization"]}})
+    assert not matches(cell, {"intent": ["eval"]})  # no substring matching
+    assert not matches(cell, {"has_error": 0})  # False is not 0, as in Chroma
+
+
+def test_range_operators_never_raise_on_odd_values():
+    for value in ("12", None, True, [1]):
+        assert not matches({"cell_index": value}, {"cell_index": {"$gt": 3}})
+    assert not matches({}, {"cell_index": {"$lte": 3}})
+
+
+def test_route_query():
+    assert route_query("What accuracy did the SVM reach?") == {"intent": ["evaluation", "model_training"]}
+    assert route_query("Show me the heatmap") == {"intent": ["visualization"]}
+    assert route_query("How was the data loaded?") is None
+
+
+# --------------------------------------------------
+# Backend parity: the same filter selects the same rows in Chroma, the NumPy store and matches()
+# --------------------------------------------------
+PARITY_FILTERS = [
+    {"intent": "evaluation"},
+    {"intent": ["evaluation", "visualization"]},
+    {"has_error": True},
+    {"has_error": 0},
+    {"cell_index": {"$gte": 10, "$lt": 20}},
+    {"cell_index": {"$gt": 2.5}},
+    {"intent": {"$ne": "evaluation"}},
+    {"intent": {"$nin": ["evaluation"]}},
+    {"notebook_path": "a.ipynb"},
+    {"notebook_path": {"$ne": "a.ipynb"}},
+    {"intent": "evaluation", "has_error": False, "cell_index": {"$lte": 30}},
+    {"intent": ["nothing"]},
+]
+
+
+@pytest.fixture(scope="module")
+def backends(tmp_path_factory):
+    rng = random.Random(1)
+    metadatas = []
+    for i in range(40):
+        metadata = {"cell_id": f"c{i}", "cell_index": i, "has_error": rng.random() < 0.3,
+                    "intent": rng.choice(["evaluation", "preprocessing", "visualization"])}
+        if i % 5:  # some chunks have no notebook_path at all
+            metadata["notebook_path"] = rng.choice(["a.ipynb", "b.ipynb"])
+        metadatas.append(metadata)
+    ids = [f"id{i}" for i in range(40)]
+    embeddings = np.random.default_rng(0).normal(size=(40, 4)).tolist()
+    documents = [f"doc {i}" for i in range(40)]
+
+    collection = chromadb.EphemeralClient().create_collection(f"parity-{uuid.uuid4().hex[:8]}")
+    collection.add(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    path = str(tmp_path_factory.mktemp("numpy_store"))
+    NumpyVectorStore.write(path, ids, embeddings, documents, metadatas)
+
+    return ids, metadatas, collection, NumpyVectorStore(path)
+
+
+@pytest.mark.parametrize("filters", PARITY_FILTERS)
+def test_where_parity_between_backends(backends, filters):
+    ids, metadatas, collection, store = backends
+    where = build_where(filters)
+
+    chroma_ids = set(collection.get(where=where)["ids"])
+    numpy_ids = {ids[i] for i in np.flatnonzero(store._mask(where))}
+    python_ids = {ids[i] for i, metadata in enumerate(metadatas) if matches(metadata, filters)}
+
+    assert chroma_ids == numpy_ids == python_ids
@@ -0,0 +1,64 @@
+import json
+
+import nbformat
+import pytest
+
+import corpus_ingest
+import tracing
+
+
+@pytest.fixture
+def trace_path(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    tracing.reset()
+    tracing.enable(str(path))
+    yield path
+    tracing.disable()
+    tracing.reset()
+
+
+def _write_notebook(path, sources):
+    nb = nbformat.v4.new_notebook(cells=[nbformat.v4.new_code_cell(s) for s in sources])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    nbformat.write(nb, str(path))
+
+
+def test_worker_spans_and_metrics_reach_the_parent(tmp_path, trace_path):
+    corpus = tmp_path / "corpus"
+    _write_notebook(corpus / "a.ipynb", ["import numpy as np", "x = np.arange(3)"])
+    _write_notebook(corpus / "sub" / "b.ipynb", ["print('hi')"])
+
+    cells, report = corpus_ingest.ingest_corpus(str(corpus), max_workers=2)
+
+    assert len(cells) == 3
+    assert tracing.summary()["parse"]["calls"] == 2
+    assert 'nbrag_bytes_read_total{kind="notebook"}' in tracing.prometheus_text()
+
+    records = [json.loads(line) for line in trace_path.read_text(encoding="utf-8").splitlines()]
+    ids = [r["span_id"] for r in records]
+    assert len(ids) == len(set(ids))
+    root = next(r for r in records if r["name"] == "corpus_ingest")
+    assert [r["parent_id"] for r in records if r["name"] == "parse"] == [root["span_id"]] * 2
+
+
+def test_merge_renumbers_spans_and_sums_metrics(trace_path):
+    exported = {
+        "counters": [(("bytes_read", (("kind", "notebook"),)), 10)],
+        "histograms": [],
+        "spans": [
+            {"name": "child", "span_id": 2, "parent_id": 1, "attrs": {}},
+            {"name": "root", "span_id": 1, "parent_id": None, "attrs": {}},
+        ],
+    }
+
+    with tracing.span("outer") as outer:
+        tracing.merge(exported)
+        tracing.merge(exported)
+
+    records = {(r["name"], r["span_id"]): r for r in map(json.loads, trace_path.read_text().splitlines())}
+    roots = [r for (name, _), r in records.items() if name == "root"]
+    children = [r for (name, _), r in records.items() if name == "child"]
+    assert len(records) == 5
+    assert all(r["parent_id"] == outer.span_id for r in roots)
+    assert sorted(c["parent_id"] for c in children) == sorted(r["span_id"] for r in roots)
+    assert 'nbrag_bytes_read_total{kind="notebook"} 20' in tracing.prometheus_text()
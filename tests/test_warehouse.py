@@ -0,0 +1,64 @@
+import json
+import os
+
+import pytest
+
+from warehouse import CellWarehouse
+
+CELLS = {
+    "nb::c1": {"cell_id": "nb::c1", "source": "import pandas as pd", "cell_index": 0},
+    "nb::c2": {"cell_id": "nb::c2", "source": "df = pd.read_csv('x.csv')", "cell_index": 1},
+    "nb::c3": {"cell_id": "nb::c3", "source": "df.describe()", "cell_index": 2},
+}
+
+
+@pytest.fixture
+def warehouse(tmp_path):
+    wh = CellWarehouse(str(tmp_path / "warehouse.sqlite"), hot_cells=2)
+    wh.write(CELLS)
+    return wh
+
+
+def test_lookups(warehouse):
+    assert len(warehouse) == 3
+    assert sorted(warehouse.cell_ids()) == sorted(CELLS)
+    assert warehouse["nb::c2"] == CELLS["nb::c2"]
+    assert "nb::c1" in warehouse
+    assert "nb::missing" not in warehouse
+    assert warehouse.get("nb::missing", {}) == {}
+    with pytest.raises(KeyError):
+        warehouse["nb::missing"]
+
+
+def test_get_many_keeps_request_order_and_skips_unknown_ids(warehouse):
+    # more ids than hot_cells, so some come from the cache and some from SQLite
+    warehouse.get("nb::c3")
+    found = warehouse.get_many(["nb::c3", "nb::missing", "nb::c1", "nb::c2", "nb::c1"])
+
+    assert list(found) == ["nb::c3", "nb::c1", "nb::c2"]
+    assert found["nb::c1"] == CELLS["nb::c1"]
+    assert warehouse.stats()["hot_cells"] == 2
+
+
+def test_write_replaces_previous_contents(warehouse):
+    warehouse.get("nb::c1")  # cached before the rewrite
+    warehouse.write({"nb::c9": {"cell_id": "nb::c9", "source": "pass"}})
+
+    assert warehouse.cell_ids() == ["nb::c9"]
+    assert warehouse.get("nb::c1") is None
+
+
+def test_migrate_json_and_staleness(tmp_path):
+    json_path = tmp_path / "custom_object.json"
+    json_path.write_text(json.dumps(CELLS), encoding="utf-8")
+    wh = CellWarehouse(str(tmp_path / "warehouse.sqlite"))
+
+    assert wh.is_stale(str(json_path))
+    wh.migrate_json(str(json_path))
+    assert not wh.is_stale(str(json_path))
+    assert wh.get_many(CELLS) == CELLS
+
+    json_path.write_text(json.dumps({}), encoding="utf-8")
+    stat = os.stat(json_path)
+    os.utime(json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert wh.is_stale(str(json_path))
@@ -0,0 +1,329 @@
+# tracing.py: lightweight stage tracing and metrics for the ingest and query pipelines.
+# Spans time a stage (parse, embed, vector search, LLM call, ...), counters and histograms collect
+# tokens, bytes and latencies. Export: a JSON-lines trace file and Prometheus text (query_server /metrics).
+#
+# Off by default; every hook then returns after one flag check. Enable with NBRAG_TRACE=1
+# (spans go to NBRAG_TRACE_FILE, default artifacts/trace.jsonl) or call tracing.enable().
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+TRACE_FILE = "artifacts/trace.jsonl"
+METRICS_PREFIX = "nbrag_"
+
+# Seconds; the LLM and embedding calls of this project range from milliseconds to minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class _State:
+    enabled = False
+    trace_path: str | None = None
+
+
+_state = _State()
+_lock = threading.Lock()
+_span_ids = itertools.count(1)
+_current_span = contextvars.ContextVar("nbrag_current_span", default=None)
+
+_counters: Dict[Tuple[str, Tuple], float] = {}
+_histograms: Dict[Tuple[str, Tuple], list] = {}  # key -> [bucket counts..., sum, count]
+_trace_file = None
+_span_buffer: list | None = None  # span records kept in memory instead of a file (pool workers)
+
+
+def enable(trace_path: str | None = TRACE_FILE):
+    """Turns tracing on; trace_path=None keeps metrics in memory without writing spans."""
+    global _trace_file
+    with _lock:
+        _state.enabled = True
+        _state.trace_path = trace_path
+        if _trace_file is not None:
+            _trace_file.close()
+            _trace_file = None
+        if trace_path:
+            Path(trace_path).parent.mkdir(parents=True, exist_ok=True)
+            _trace_file = open(trace_path, "a", encoding="utf-8", buffering=1)
+
+
+def disable():
+    global _trace_file
+    with _lock:
+        _state.enabled = False
+        if _trace_file is not None:
+            _trace_file.close()
+            _trace_file = None
+
+
+def is_enabled() -> bool:
+    return _state.enabled
+
+
+def reset():
+    """Drops all collected metrics."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+# --------------------------------------------------
+# Process pools
+# --------------------------------------------------
+def init_worker(enabled: bool):
+    """
+    ProcessPoolExecutor initializer. A worker never writes the trace file itself (concurrent appends
+    would interleave): it keeps its spans and metrics in memory until drain(), and the parent merge()s them.
+    """
+    global _trace_file, _span_buffer
+    with _lock:
+        # A forked worker inherits the parent's open trace file and metrics; the parent keeps both
+        _trace_file = None
+        _counters.clear()
+        _histograms.clear()
+        _state.enabled = enabled
+        _state.trace_path = None
+        _span_buffer = [] if enabled else None
+
+
+def drain() -> Dict:
+    """This process' metrics and buffered spans as picklable data for merge(); clears them."""
+    with _lock:
+        exported = {
+            "counters": list(_counters.items()),
+            "histograms": list(_histograms.items()),
+            "spans": list(_span_buffer or []),
+        }
+        _counters.clear()
+        _histograms.clear()
+        if _span_buffer is not None:
+            _span_buffer.clear()
+    return exported
+
+
+def merge(exported: Dict):
+    """
+    Adds a worker's drain() output here: counters and histograms are summed, and spans get fresh ids and
+    are written to this process' trace file, with the worker's root spans nested under the current span.
+    """
+    if not _state.enabled or not exported:
+        return
+    parent = _current_span.get()
+    with _lock:
+        for key, value in exported["counters"]:
+            _counters[key] = _counters.get(key, 0) + value
+        for key, values in exported["histograms"]:
+            buckets = _histograms.setdefault(key, [0] * len(LATENCY_BUCKETS) + [0.0, 0])
+            for i, value in enumerate(values):
+                buckets[i] += value
+
+        # Records are written on exit, so a child comes before its parent: renumber them all first
+        ids = {record["span_id"]: next(_span_ids) for record in exported["spans"]}
+        for record in exported["spans"]:
+            parent_id = ids.get(record["parent_id"], parent.span_id if parent is not None else None)
+            _emit(dict(record, span_id=ids[record["span_id"]], parent_id=parent_id))
+
+
+# --------------------------------------------------
+# Metrics
+# --------------------------------------------------
+def _key(name: str, labels: Dict) -> Tuple[str, Tuple]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def count(name: str, value: float = 1, **labels):
+    """Adds value to the counter `name` (e.g. count("tokens", 512, kind="prompt"))."""
+    if not _state.enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels):
+    """Records one observation (seconds) in the histogram `name`."""
+    if not _state.enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        buckets = _histograms.setdefault(key, [0] * len(LATENCY_BUCKETS) + [0.0, 0])
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                buckets[i] += 1
+        buckets[-2] += value
+        buckets[-1] += 1
+
+
+def record_llm_usage(response, stage: str, model: str | None = None):
+    """Token counters from a LangChain AIMessage's usage_metadata, when the provider reports it."""
+    if not _state.enabled:
+        return
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens"):
+        count("llm_tokens", usage["input_tokens"], kind="input", stage=stage, model=model or "")
+    if usage.get("output_tokens"):
+        count("llm_tokens", usage["output_tokens"], kind="output", stage=stage, model=model or "")
+
+
+# --------------------------------------------------
+# Spans
+# --------------------------------------------------
+class _NullSpan:
+    """Returned when tracing is off: entering, exiting and set() do nothing."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "span_id", "parent_id", "_start", "_wall", "_token")
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(_span_ids)
+        self.parent_id = None
+
+    def set(self, **attrs):
+        """Adds attributes known only inside the span (sizes, cache hits, ...)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self._token = _current_span.set(self)
+        self._wall = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+
+        observe("stage_seconds", seconds, stage=self.name)
+        if exc_type is not None:
+            count("stage_errors", stage=self.name)
+
+        if _trace_file is not None or _span_buffer is not None:
+            record = {
+                "name": self.name,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                "start": round(self._wall, 6),
+                "duration_ms": round(seconds * 1000, 3),
+                "pid": os.getpid(),
+                "thread": threading.current_thread().name,
+                "error": exc_type.__name__ if exc_type is not None else None,
+                "attrs": self.attrs,
+            }
+            with _lock:
+                _emit(record)
+        return False
+
+
+def _emit(record: Dict):
+    """Writes one finished span (caller holds _lock)."""
+    if _trace_file is not None:
+        _trace_file.write(json.dumps(record, default=str) + "\n")
+    elif _span_buffer is not None:
+        _span_buffer.append(record)
+
+
+def span(name: str, **attrs):
+    """
+    Times a pipeline stage:  with tracing.span("vector_search", backend="numpy") as s: ...; s.set(k=15)
+    Nested spans record their parent, across threads started with asyncio.to_thread too.
+    """
+    if not _state.enabled:
+        return _NULL_SPAN
+    return Span(name, attrs)
+
+
+def traced(name: str):
+    """Decorator form of span() for whole functions."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return fn(*args, **kwargs)
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --------------------------------------------------
+# Export
+# --------------------------------------------------
+def _format_labels(labels: Tuple, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def prometheus_text() -> str:
+    """All counters and histograms in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(values) for key, values in _histograms.items()}
+
+    lines = []
+    for metric in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {METRICS_PREFIX}{metric}_total counter")
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"{METRICS_PREFIX}{metric}_total{_format_labels(labels)} {value:g}")
+
+    for metric in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE {METRICS_PREFIX}{metric} histogram")
+        for (name, labels), values in sorted(histograms.items()):
+            if name != metric:
+                continue
+            for bound, bucket in zip(LATENCY_BUCKETS, values):
+                le = 'le="%g"' % bound
+                lines.append(f"{METRICS_PREFIX}{metric}_bucket{_format_labels(labels, le)} {bucket}")
+            le = 'le="+Inf"'
+            lines.append(f"{METRICS_PREFIX}{metric}_bucket{_format_labels(labels, le)} {values[-1]}")
+            lines.append(f"{METRICS_PREFIX}{metric}_sum{_format_labels(labels)} {values[-2]:.6f}")
+            lines.append(f"{METRICS_PREFIX}{metric}_count{_format_labels(labels)} {values[-1]}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+
+
+def summary() -> Dict[str, Dict]:
+    """Per-stage call count and total / mean seconds, for quick printing."""
+    with _lock:
+        stages = {
+            dict(labels).get("stage"): values
+            for (name, labels), values in _histograms.items() if name == "stage_seconds"
+        }
+    return {
+        stage: {"calls": values[-1], "total_s": round(values[-2], 3),
+                "mean_ms": round(values[-2] / values[-1] * 1000, 3) if values[-1] else 0.0}
+        for stage, values in sorted(stages.items())
+    }
+
+
+if os.environ.get("NBRAG_TRACE", "").lower() not in ("", "0", "false", "no"):
+    enable(os.environ.get("NBRAG_TRACE_FILE", TRACE_FILE) or None)
@@ -0,0 +1,163 @@
+# warehouse.py: the cell warehouse (cell_id -> full cell dict) as an indexed SQLite table.
+# Opening it costs the same for one notebook or a whole corpus; the retriever fetches only the
+# cells a query needs, through a small in-memory LRU of hot cells.
+# artifacts/custom_object.json stays the interchange format and is migrated into it.
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+WAREHOUSE_PATH = "artifacts/warehouse.sqlite"
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+class CellWarehouse:
+    """
+    Dict-like, read-mostly access to the warehouse: `cell_id in wh`, `wh[cell_id]`, `len(wh)`,
+    plus get() / get_many(). Thread-safe, so one warehouse can serve several sessions.
+    """
+
+    def __init__(self, path: str = WAREHOUSE_PATH, hot_cells: int = 256):
+        self.path = path
+        self.hot_cells = hot_cells
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cells (cell_id TEXT PRIMARY KEY, payload TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+        self._hot = OrderedDict()  # cell_id -> cell dict, least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    # --------------------------------------------------
+    # Write side
+    # --------------------------------------------------
+    def write(self, cells: Dict[str, Dict], source_path: str | None = None):
+        """Replaces the whole warehouse with `cells`; source_path records which JSON it mirrors."""
+        rows = [(cell_id, json.dumps(cell, separators=(",", ":"))) for cell_id, cell in cells.items()]
+
+        with self._lock:
+            with self._conn:  # one transaction
+                self._conn.execute("DELETE FROM cells")
+                self._conn.executemany("INSERT INTO cells (cell_id, payload) VALUES (?, ?)", rows)
+                if source_path:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO meta (key, value) VALUES ('source', ?)",
+                        (self._source_stamp(source_path),)
+                    )
+            self._hot.clear()
+
+        print(f"🏬 Warehouse written to {self.path} ({len(rows)} cells)")
+
+    def migrate_json(self, json_path: str):
+        """One-shot migration from a custom_object.json file."""
+        with open(json_path, "r", encoding="utf-8") as f:
+            cells = json.load(f)
+        self.write(cells, source_path=json_path)
+
+    @staticmethod
+    def _source_stamp(json_path: str) -> str:
+        stat = os.stat(json_path)
+        return f"{os.path.abspath(json_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def is_stale(self, json_path: str) -> bool:
+        """True when json_path changed (or was never migrated) since the last write."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        return row is None or row[0] != self._source_stamp(json_path)
+
+    # --------------------------------------------------
+    # Read side
+    # --------------------------------------------------
+    def _remember(self, cell_id: str, cell: Dict):
+        self._hot[cell_id] = cell
+        self._hot.move_to_end(cell_id)
+        while len(self._hot) > self.hot_cells:
+            self._hot.popitem(last=False)
+
+    def get(self, cell_id: str, default=None) -> Dict | None:
+        with self._lock:
+            if cell_id in self._hot:
+                self._hot.move_to_end(cell_id)
+                self.hits += 1
+                return self._hot[cell_id]
+
+            self.misses += 1
+            row = self._conn.execute("SELECT payload FROM cells WHERE cell_id = ?", (cell_id,)).fetchone()
+            if row is None:
+                return default
+
+            cell = json.loads(row[0])
+            self._remember(cell_id, cell)
+            return cell
+
+    def get_many(self, cell_ids: Iterable[str]) -> Dict[str, Dict]:
+        """The cells found among cell_ids, in one query per batch of uncached ids."""
+        cell_ids = list(dict.fromkeys(cell_ids))
+        found = {}
+
+        with self._lock:
+            missing = []
+            for cell_id in cell_ids:
+                if cell_id in self._hot:
+                    self._hot.move_to_end(cell_id)
+                    found[cell_id] = self._hot[cell_id]
+                else:
+                    missing.append(cell_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+
+            for start in range(0, len(missing), _LOOKUP_BATCH):
+                batch = missing[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT cell_id, payload FROM cells WHERE cell_id IN ({placeholders})", batch
+                )
+                for cell_id, payload in rows:
+                    found[cell_id] = json.loads(payload)
+                    self._remember(cell_id, found[cell_id])
+
+        return {cell_id: found[cell_id] for cell_id in cell_ids if cell_id in found}
+
+    def __getitem__(self, cell_id: str) -> Dict:
+        cell = self.get(cell_id)
+        if cell is None:
+            raise KeyError(cell_id)
+        return cell
+
+    def __contains__(self, cell_id) -> bool:
+        # Membership checks are almost always followed by a lookup, so this warms the hot cache
+        return self.get(cell_id) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cells").fetchone()[0]
+
+    def cell_ids(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT cell_id FROM cells")]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hot_cells": len(self._hot),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+if __name__ == "__main__":
+    # python warehouse.py [artifacts/custom_object.json] [artifacts/warehouse.sqlite]
+    source = sys.argv[1] if len(sys.argv) > 1 else "artifacts/custom_object.json"
+    target = sys.argv[2] if len(sys.argv) > 2 else WAREHOUSE_PATH
+    CellWarehouse(target).migrate_json(source)